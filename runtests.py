@@ -28,9 +28,12 @@ except ImportError:
     exit(-1)
 
 
-def configure_django():
-    """Configure Django before tests"""
-    settings.configure(
+def configure_django(**overrides):
+    """Configure Django before tests
+
+    Keyword arguments override (or add to) the settings below.
+    """
+    django_settings = dict(
         SECRET_KEY="m-4Umd2!_nQQX.Ux6dYaiffmgRFpFxri!hqmffqBAhuAu*-!9n",
         DATABASES={
             "default": {
@@ -70,6 +73,8 @@ def configure_django():
             "django.contrib.messages.middleware.MessageMiddleware",
         ],
     )
+    django_settings.update(overrides)
+    settings.configure(**django_settings)
     setup()
 
 
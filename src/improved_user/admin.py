@@ -1,13 +1,69 @@
 """Admin Configuration for Improved User"""
 
+import json
+
+from django.contrib import admin
+from django.contrib.admin.models import CHANGE, LogEntry
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from django.utils.translation import gettext_lazy as _
+from django.contrib.contenttypes.models import ContentType
+from django.core.paginator import Paginator
+from django.db import connections, transaction
+from django.utils import translation
+from django.utils.functional import cached_property
+from django.utils.text import capfirst
+from django.utils.translation import gettext_lazy as _, ngettext
 
+from .cache import bump_permissions_version, invalidate_users
 from .forms import UserChangeForm, UserCreationForm
+from .managers import filter_by_email
+from .search import has_search_index, search
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that estimates the size of large, unfiltered tables
+
+    Counting every row of a table with millions of rows is slow. When
+    the queryset is unfiltered and the database is PostgreSQL, the
+    planner's estimate (``pg_class.reltuples``) is used instead, if
+    above ``estimate_threshold``. Otherwise, rows are counted.
+    """
+
+    estimate_threshold = 100000
+
+    @cached_property
+    def count(self):
+        """Return the (possibly estimated) number of objects"""
+        estimate = self.estimate_count()
+        if estimate is not None and estimate > self.estimate_threshold:
+            return estimate
+        return super().count
+
+    def estimate_count(self):
+        """Return estimated number of rows, or None if unavailable"""
+        queryset = self.object_list
+        query = getattr(queryset, "query", None)
+        if query is None or query.where:
+            return None
+        connection = connections[queryset.db]
+        if connection.vendor != "postgresql":
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples FROM pg_class WHERE oid = %s::regclass",
+                [connection.ops.quote_name(queryset.model._meta.db_table)],
+            )
+            row = cursor.fetchone()
+        if row is None or row[0] < 0:  # -1: table never analyzed
+            return None
+        return int(row[0])
 
 
 class UserAdmin(BaseUserAdmin):
-    """Admin panel for Improved User, mimics Django's default"""
+    """Admin panel for Improved User, mimics Django's default
+
+    Set :attr:`high_scale` on a subclass for tables with millions of
+    users (see :doc:`/admin_usage`).
+    """
 
     fieldsets = (
         (None, {"fields": ("email", "password")}),
@@ -40,3 +96,199 @@ class UserAdmin(BaseUserAdmin):
     list_display = ("email", "full_name", "short_name", "is_staff")
     search_fields = ("email", "full_name", "short_name")
     ordering = ("email",)
+    actions = (
+        "activate_users",
+        "deactivate_users",
+        "remove_staff_status",
+        "remove_superuser_status",
+    )
+
+    #: Number of users each bulk action updates (and logs) per query
+    action_chunk_size = 1000
+
+    #: Estimate page counts, skip the full result count, and search only
+    #: by exact email (if the term contains ``@``) or email prefix, so
+    #: that each query may use the email index.
+    high_scale = False
+
+    @property
+    def show_full_result_count(self):
+        """Count all users (beside filtered results) unless high scale"""
+        return not self.high_scale
+
+    def get_paginator(self, request, queryset, *args, **kwargs):
+        """Estimate page counts in high-scale mode"""
+        if self.high_scale:
+            return EstimatedCountPaginator(queryset, *args, **kwargs)
+        return super().get_paginator(request, queryset, *args, **kwargs)
+
+    def get_search_results(self, request, queryset, search_term):
+        """Search by exact email or search index in high-scale mode
+
+        Models without a search index are searched by email prefix.
+        """
+        search_term = search_term.strip()
+        if not self.high_scale or not search_term:
+            return super().get_search_results(request, queryset, search_term)
+        model = queryset.model
+        field_name = model.get_email_field_name()
+        if "@" not in search_term and has_search_index(model):
+            return search(queryset, search_term), False
+        if "@" not in search_term:
+            lookup = {f"{field_name}__startswith": search_term}
+            return queryset.filter(**lookup), False
+        # pylint: disable=protected-access
+        manager = model._default_manager
+        case_insensitive = (
+            hasattr(manager, "_email_case_insensitive")
+            and manager._email_case_insensitive()
+        )
+        # pylint: enable=protected-access
+        email = manager.normalize_email(search_term)
+        return filter_by_email(queryset, email, case_insensitive), False
+
+    def has_superuser_permission(self, request):
+        """Allow only superusers to run superuser actions"""
+        return request.user.is_active and request.user.is_superuser
+
+    def bulk_update_users(self, request, queryset, exclude_self, **values):
+        """Set values on users in chunks; log each user changed
+
+        Users already set to values are skipped, as is the acting user
+        if exclude_self. Users are not loaded: primary keys and emails
+        are read ``action_chunk_size`` at a time, and each chunk is
+        updated and logged with one query each. Return the number of
+        users changed.
+        """
+        model = queryset.model
+        queryset = queryset.exclude(**values).order_by("pk")
+        if exclude_self:
+            queryset = queryset.exclude(pk=request.user.pk)
+        content_type = ContentType.objects.get_for_model(
+            model, for_concrete_model=False
+        )
+        with translation.override(None):
+            change_message = json.dumps(
+                [
+                    {
+                        "changed": {
+                            "fields": [
+                                str(capfirst(field.verbose_name))
+                                for field in map(model._meta.get_field, values)
+                            ]
+                        }
+                    }
+                ]
+            )
+        email_field = model.get_email_field_name()
+        changed = 0
+        batch = queryset
+        while True:
+            rows = list(
+                batch.values_list("pk", email_field)[: self.action_chunk_size]
+            )
+            if not rows:
+                break
+            pks = [pk for pk, _email in rows]
+            with transaction.atomic(using=queryset.db):
+                model._base_manager.using(queryset.db).filter(
+                    pk__in=pks
+                ).update(**values)
+                LogEntry.objects.bulk_create(
+                    LogEntry(
+                        user_id=request.user.pk,
+                        content_type_id=content_type.pk,
+                        object_id=str(pk),
+                        object_repr=str(email)[:200],
+                        action_flag=CHANGE,
+                        change_message=change_message,
+                    )
+                    for pk, email in rows
+                )
+            invalidate_users(model, pks)
+            if "is_superuser" in values:
+                # cached permissions of superusers include every permission
+                bump_permissions_version(model, pks)
+            changed += len(rows)
+            batch = queryset.filter(pk__gt=pks[-1])
+        return changed
+
+    @admin.action(
+        description=_("Activate selected %(verbose_name_plural)s"),
+        permissions=["change"],
+    )
+    def activate_users(self, request, queryset):
+        """Activate users with bulk updates"""
+        count = self.bulk_update_users(
+            request, queryset, exclude_self=False, is_active=True
+        )
+        self.message_user(
+            request,
+            ngettext(
+                "Activated %(count)d user.",
+                "Activated %(count)d users.",
+                count,
+            )
+            % {"count": count},
+        )
+
+    @admin.action(
+        description=_("Deactivate selected %(verbose_name_plural)s"),
+        permissions=["change"],
+    )
+    def deactivate_users(self, request, queryset):
+        """Deactivate users (but not oneself) with bulk updates"""
+        count = self.bulk_update_users(
+            request, queryset, exclude_self=True, is_active=False
+        )
+        self.message_user(
+            request,
+            ngettext(
+                "Deactivated %(count)d user.",
+                "Deactivated %(count)d users.",
+                count,
+            )
+            % {"count": count},
+        )
+
+    @admin.action(
+        description=_(
+            "Remove staff status of selected %(verbose_name_plural)s"
+        ),
+        permissions=["change"],
+    )
+    def remove_staff_status(self, request, queryset):
+        """Remove staff status of users (but not oneself) in bulk"""
+        count = self.bulk_update_users(
+            request, queryset, exclude_self=True, is_staff=False
+        )
+        self.message_user(
+            request,
+            ngettext(
+                "Removed staff status of %(count)d user.",
+                "Removed staff status of %(count)d users.",
+                count,
+            )
+            % {"count": count},
+        )
+
+    @admin.action(
+        description=_(
+            "Remove superuser status of selected %(verbose_name_plural)s"
+        ),
+        permissions=["superuser"],
+    )
+    def remove_superuser_status(self, request, queryset):
+        """Remove superuser status of users (but not oneself) in bulk"""
+        count = self.bulk_update_users(
+            request, queryset, exclude_self=True, is_superuser=False
+        )
+        self.message_user(
+            request,
+            ngettext(
+                "Removed superuser status of %(count)d user.",
+                "Removed superuser status of %(count)d users.",
+                count,
+            )
+            % {"count": count},
+        )
@@ -1,8 +1,8 @@
 """App Configuration for Improved User"""
 
 from django.apps import AppConfig
-from django.contrib import admin
 from django.contrib.auth import get_user_model
+from django.db.models.query_utils import DeferredAttribute
 from django.utils.translation import gettext_lazy as _
 
 
@@ -14,15 +14,37 @@ class ImprovedUserConfig(AppConfig):
     default_auto_field = "django.db.models.AutoField"
 
     def ready(self):
-        """Register User model for Admin
+        """Register User model for Admin; connect cache invalidation
 
         Ensure UserAdmin is only used when application is added to
         Installed Apps, and that UserAdmin can be imported if necessary
         (please note: not recommended. Please see the docs).
 
         https://django-improved-user.rtfd.io/en/latest/admin_usage.html
-        """
-        from .admin import UserAdmin
 
+        The admin panel (and the forms it uses) is only imported if
+        the Django admin is installed, so that processes without it
+        (such as task workers) do not pay for it at startup.
+
+        Django's receiver that saves ``last_login`` is replaced by one
+        that may throttle and buffer the updates (see
+        :py:mod:`improved_user.last_login`).
+
+        Cached users must be invalidated in every process (not just
+        those that load the authentication backends, which projects may
+        subclass), so signals are connected here.
+        """
         User = get_user_model()  # pylint: disable=invalid-name
-        admin.site.register(User, UserAdmin)
+        if self.apps.is_installed("django.contrib.admin"):
+            from django.contrib import admin
+
+            from .admin import UserAdmin
+
+            admin.site.register(User, UserAdmin)
+        if isinstance(getattr(User, "last_login", None), DeferredAttribute):
+            from . import last_login
+
+            last_login.connect_signals()
+        from .cache import connect_signals
+
+        connect_signals(User)
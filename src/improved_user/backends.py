@@ -0,0 +1,109 @@
+"""Authentication Backends for Improved User"""
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+from .cache import connect_signals, get_cache, get_timeout, permissions_key
+
+connect_signals(get_user_model())
+
+
+class CachedModelBackend(ModelBackend):
+    """Authenticate against the User model; serve users from cache
+
+    Behaves as Django's :class:`~django.contrib.auth.backends.ModelBackend`,
+    but loads users with
+    :meth:`~improved_user.managers.UserManager.get_by_natural_key_cached`
+    and :meth:`~improved_user.managers.UserManager.get_cached`, so that
+    loading the user of a session does not query the database on every
+    request.
+
+    .. code:: python
+
+        AUTHENTICATION_BACKENDS = [
+            "improved_user.backends.CachedModelBackend",
+        ]
+
+    Cached users are invalidated when saved or deleted. Updates that
+    bypass ``save()`` (such as ``QuerySet.update()``) must call
+    :func:`improved_user.cache.invalidate_users`.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        """Authenticate user by natural key (email) and password"""
+        UserModel = get_user_model()  # pylint: disable=invalid-name
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        # pylint: disable=protected-access
+        manager = UserModel._default_manager
+        # pylint: enable=protected-access
+        try:
+            user = manager.get_by_natural_key_cached(username)
+        except UserModel.DoesNotExist:
+            # Run the default password hasher once to reduce the timing
+            # difference between an existing and a nonexistent user.
+            UserModel().set_password(password)
+        else:
+            if user.check_password(password) and self.user_can_authenticate(
+                user
+            ):
+                return user
+        return None
+
+    def get_user(self, user_id):
+        """Return the (possibly cached) user with primary key user_id"""
+        UserModel = get_user_model()  # pylint: disable=invalid-name
+        try:
+            # pylint: disable=protected-access
+            user = UserModel._default_manager.get_cached(user_id)
+            # pylint: enable=protected-access
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
+
+
+class CachedPermissionBackend(ModelBackend):
+    """Resolve permissions as ModelBackend; share them across requests
+
+    Django's :class:`~django.contrib.auth.backends.ModelBackend` caches
+    permissions on the user instance, which lasts a single request.
+    This backend stores each user's user and group permission sets in
+    cache, keyed by primary key and version. Versions are bumped when
+    the groups or permissions of a user change, and for all users when
+    the permissions of a group change or a group or permission is
+    saved or deleted.
+
+    .. code:: python
+
+        AUTHENTICATION_BACKENDS = [
+            "improved_user.backends.CachedPermissionBackend",
+        ]
+
+    To cache both users and permissions, combine the backends.
+
+    .. code:: python
+
+        class CachedBackend(CachedPermissionBackend, CachedModelBackend):
+            pass
+    """
+
+    def _get_permissions(self, user_obj, obj, from_name):
+        """Return permission set from cache, or compute and cache it"""
+        if (
+            not user_obj.is_active
+            or user_obj.is_anonymous
+            or obj is not None
+            or hasattr(user_obj, f"_{from_name}_perm_cache")
+        ):
+            return super()._get_permissions(user_obj, obj, from_name)
+        cache = get_cache()
+        key = permissions_key(user_obj, from_name)
+        perms = cache.get(key)
+        if perms is None:
+            perms = super()._get_permissions(user_obj, obj, from_name)
+            cache.set(key, perms, get_timeout())
+        else:
+            setattr(user_obj, f"_{from_name}_perm_cache", perms)
+        return perms
@@ -0,0 +1,179 @@
+"""Cache helpers used to avoid querying for Improved Users
+
+Entries are stored in the cache named by the ``IMPROVED_USER_CACHE``
+setting (``"default"`` if unset) for ``IMPROVED_USER_CACHE_TIMEOUT``
+seconds (300 if unset).
+"""
+
+from hashlib import sha256
+from uuid import uuid4
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+KEY_PREFIX = "improved_user"
+
+
+def get_cache():
+    """Return the cache used by Improved User"""
+    return caches[getattr(settings, "IMPROVED_USER_CACHE", "default")]
+
+
+def get_timeout():
+    """Return the number of seconds entries are cached"""
+    return getattr(settings, "IMPROVED_USER_CACHE_TIMEOUT", 300)
+
+
+def user_key(model, pk):
+    """Return cache key of user with primary key pk"""
+    return f"{KEY_PREFIX}:{model._meta.label_lower}:pk:{pk}"
+
+
+def natural_key_key(model, username):
+    """Return cache key of primary key of user with username
+
+    The username is hashed to keep the key short and free of characters
+    some cache backends reject.
+    """
+    digest = sha256(username.encode()).hexdigest()
+    return f"{KEY_PREFIX}:{model._meta.label_lower}:nk:{digest}"
+
+
+def invalidate_users(model, pks):
+    """Remove users with primary keys pks from cache
+
+    Use after bulk operations (such as ``QuerySet.update()``) that do
+    not send ``post_save``.
+    """
+    get_cache().delete_many([user_key(model, pk) for pk in pks])
+
+
+def permissions_version_key(model, pk=None):
+    """Return cache key of permission version of user pk (or all users)"""
+    if pk is None:
+        return f"{KEY_PREFIX}:{model._meta.label_lower}:perms:version"
+    return f"{KEY_PREFIX}:{model._meta.label_lower}:perms:version:{pk}"
+
+
+def permissions_key(user, from_name):
+    """Return cache key of user's permissions from "user" or "group"
+
+    The key embeds a version shared by all users and a version
+    specific to this user; bumping either orphans cached permissions.
+    Versions are random tokens (rather than counters), so an evicted
+    version can never resurrect stale entries.
+    """
+    model = type(user)
+    cache = get_cache()
+    version_keys = [
+        permissions_version_key(model),
+        permissions_version_key(model, user.pk),
+    ]
+    versions = cache.get_many(version_keys)
+    for key in version_keys:
+        if key not in versions:
+            cache.add(key, uuid4().hex, None)
+            versions[key] = cache.get(key)
+    return ":".join(
+        [
+            f"{KEY_PREFIX}:{model._meta.label_lower}:perms:{from_name}",
+            str(user.pk),
+            str(int(user.is_superuser)),
+            *(str(versions[key]) for key in version_keys),
+        ]
+    )
+
+
+def bump_permissions_version(model, pks=None):
+    """Invalidate cached permissions of users pks (or all users)"""
+    if pks is None:
+        keys = [permissions_version_key(model)]
+    else:
+        keys = [permissions_version_key(model, pk) for pk in pks]
+    get_cache().set_many({key: uuid4().hex for key in keys}, None)
+
+
+# pylint: disable=unused-argument
+def invalidate_user(sender, instance, **kwargs):
+    """Remove a saved or deleted user from cache; signal receiver"""
+    get_cache().delete_many(
+        [
+            user_key(sender, instance.pk),
+            natural_key_key(sender, instance.get_username()),
+            natural_key_key(sender, instance.get_username().lower()),
+        ]
+    )
+
+
+def invalidate_user_permissions(
+    sender, instance, action, reverse, model, pk_set, **kwargs
+):
+    """Bump users whose groups or permissions changed; signal receiver"""
+    if not action.startswith("post_"):
+        return
+    if not reverse:
+        bump_permissions_version(type(instance), [instance.pk])
+    else:
+        bump_permissions_version(model, pk_set)
+
+
+def invalidate_all_permissions(sender, **kwargs):
+    """Bump all users when groups or permissions change; signal receiver"""
+    action = kwargs.get("action", "post_")
+    if action.startswith("post_"):
+        bump_permissions_version(get_user_model())
+
+
+# pylint: enable=unused-argument
+
+
+def connect_signals(user_model):
+    """Invalidate cached users when user_model is saved or deleted
+
+    Also invalidate cached permissions when the groups or permissions
+    of users (or the permissions of groups) change.
+
+    Connected automatically when Improved User is installed. Safe to
+    call repeatedly.
+    """
+    # pylint: disable=import-outside-toplevel
+    from django.contrib.auth.models import Group, Permission
+
+    # pylint: enable=import-outside-toplevel
+    post_save.connect(
+        invalidate_user,
+        sender=user_model,
+        dispatch_uid="improved_user_invalidate_user_on_save",
+    )
+    post_delete.connect(
+        invalidate_user,
+        sender=user_model,
+        dispatch_uid="improved_user_invalidate_user_on_delete",
+    )
+    if not hasattr(user_model, "user_permissions"):
+        return
+    for relation in ("groups", "user_permissions"):
+        m2m_changed.connect(
+            invalidate_user_permissions,
+            sender=getattr(user_model, relation).through,
+            dispatch_uid=f"improved_user_invalidate_{relation}",
+        )
+    m2m_changed.connect(
+        invalidate_all_permissions,
+        sender=Group.permissions.through,
+        dispatch_uid="improved_user_invalidate_group_permissions",
+    )
+    for model in (Group, Permission):
+        name = model._meta.model_name
+        post_save.connect(
+            invalidate_all_permissions,
+            sender=model,
+            dispatch_uid=f"improved_user_invalidate_{name}_on_save",
+        )
+        post_delete.connect(
+            invalidate_all_permissions,
+            sender=model,
+            dispatch_uid=f"improved_user_invalidate_{name}_on_delete",
+        )
@@ -4,10 +4,45 @@ from django import forms
 from django.contrib.auth import get_user_model, password_validation
 from django.contrib.auth.forms import ReadOnlyPasswordHashField
 from django.core.exceptions import ValidationError
-from django.utils.translation import gettext as _
+from django.core.signals import setting_changed
+from django.utils.functional import lazy
+from django.utils.translation import get_language, gettext_lazy as _
+
+from .managers import filter_by_email
 
 User = get_user_model()  # pylint: disable=invalid-name
 
+_PASSWORD_HELP_TEXTS = {}
+
+
+def _password_validators_help_text_html():
+    """Return HTML help text of the password validators
+
+    Rendered once per language, when first needed (not at import), and
+    cached until the ``AUTH_PASSWORD_VALIDATORS`` setting changes.
+    """
+    language = get_language()
+    if language not in _PASSWORD_HELP_TEXTS:
+        _PASSWORD_HELP_TEXTS[language] = str(
+            password_validation.password_validators_help_text_html()
+        )
+    return _PASSWORD_HELP_TEXTS[language]
+
+
+password_validators_help_text_html = lazy(
+    _password_validators_help_text_html, str
+)
+
+
+# pylint: disable-next=unused-argument
+def _reset_password_help_texts(*, setting, **kwargs):
+    """Forget help texts when validators change; signal receiver"""
+    if setting == "AUTH_PASSWORD_VALIDATORS":
+        _PASSWORD_HELP_TEXTS.clear()
+
+
+setting_changed.connect(_reset_password_help_texts)
+
 
 class AbstractUserCreationForm(forms.ModelForm):
     """Abstract Form to create an unprivileged user
@@ -22,7 +57,7 @@ class AbstractUserCreationForm(forms.ModelForm):
     password1 = forms.CharField(
         label=_("Password"),
         widget=forms.PasswordInput,
-        help_text=password_validation.password_validators_help_text_html(),
+        help_text=password_validators_help_text_html(),
         strip=False,
     )
     password2 = forms.CharField(
@@ -109,21 +144,38 @@ class UserCreationForm(AbstractUserCreationForm):
 
         Since User.email is unique, this check is redundant,
         but it sets a nicer error message than the ORM. See #13147.
+        The check ignores case, so that addresses differing only in
+        case cannot be registered twice, and compares ``LOWER(email)``
+        so that it may use a functional index.
 
         https://code.djangoproject.com/ticket/13147
         """
         email = self.cleaned_data["email"]
+        # https://docs.djangoproject.com/en/stable/topics/db/managers/#default-managers
+        # pylint: disable=protected-access
+        duplicate = filter_by_email(
+            User._default_manager.all(), email, case_insensitive=True
+        ).exists()
+        # pylint: enable=protected-access
+        if duplicate:
+            raise forms.ValidationError(
+                self.error_messages["duplicate_email"],
+                code="duplicate_email",
+            )
+        return email
+
+    def validate_unique(self):
+        """Validate uniqueness of fields other than email
+
+        :meth:`clean_email` has already checked email; excluding it
+        here saves a second query.
+        """
+        exclude = self._get_validation_exclusions()
+        exclude.add("email")
         try:
-            # https://docs.djangoproject.com/en/stable/topics/db/managers/#default-managers
-            # pylint: disable=protected-access
-            User._default_manager.get(email=email)
-            # pylint: enable=protected-access
-        except User.DoesNotExist:
-            return email
-        raise forms.ValidationError(
-            self.error_messages["duplicate_email"],
-            code="duplicate_email",
-        )
+            self.instance.validate_unique(exclude=exclude)
+        except ValidationError as error:
+            self._update_errors(error)
 
 
 class AbstractUserChangeForm(forms.ModelForm):
@@ -0,0 +1,80 @@
+"""Password hashers that wrap legacy hashes in PBKDF2
+
+Hashes made with weak, deprecated hashers (salted SHA1 or MD5) cannot be
+rehashed without the raw password, which is only available when the
+user logs in. They may instead be wrapped: the legacy hash is used as
+the password of a PBKDF2 hash, following the pattern in Django's
+documentation on upgrading passwords.
+
+Add the wrapping hashers to ``PASSWORD_HASHERS`` (after your default
+hasher), then wrap existing hashes in batches with
+:meth:`~improved_user.managers.UserManager.upgrade_password_hashes` or
+the ``upgrade_password_hashes`` management command. Logins check
+wrapped hashes without rehashing them with the default hasher. Hashes
+of unsalted legacy hashers (``sha1$$...``, ``md5$$...`` or bare MD5)
+cannot be wrapped, and can only be upgraded at login.
+
+.. code:: python
+
+    PASSWORD_HASHERS = [
+        "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+        "improved_user.hashers.PBKDF2WrappedSHA1PasswordHasher",
+        "improved_user.hashers.PBKDF2WrappedMD5PasswordHasher",
+    ]
+"""
+
+import hashlib
+
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class PBKDF2WrappedPasswordHasher(PBKDF2PasswordHasher):
+    """PBKDF2 of a salted legacy hash; subclass to set the legacy hash"""
+
+    #: Algorithm of the hashes this hasher wraps
+    legacy_algorithm = None
+    #: hashlib constructor used by the legacy hasher
+    legacy_digest = None
+
+    def legacy_hash(self, password, salt):
+        """Return the digest the legacy hasher makes of password"""
+        return self.legacy_digest((salt + password).encode()).hexdigest()
+
+    def encode(self, password, salt, iterations=None):
+        """Hash password as the legacy hasher would; wrap the hash"""
+        return self.wrap_hash(
+            self.legacy_hash(password, salt), salt, iterations
+        )
+
+    def wrap_hash(self, legacy_hash, salt, iterations=None):
+        """Return PBKDF2 of the digest of a legacy hash"""
+        return super().encode(legacy_hash, salt, iterations)
+
+    def wrap(self, encoded):
+        """Wrap an encoded, salted legacy hash (algorithm$salt$hash)"""
+        algorithm, salt, legacy_hash = encoded.split("$", 2)
+        if algorithm != self.legacy_algorithm:
+            raise ValueError(
+                f"{self.algorithm} cannot wrap {algorithm} password hashes"
+            )
+        if not salt:
+            raise ValueError(
+                f"{self.algorithm} cannot wrap unsalted password hashes"
+            )
+        return self.wrap_hash(legacy_hash, salt)
+
+
+class PBKDF2WrappedSHA1PasswordHasher(PBKDF2WrappedPasswordHasher):
+    """Wrap hashes of Django's (removed) SHA1PasswordHasher"""
+
+    algorithm = "pbkdf2_wrapped_sha1"
+    legacy_algorithm = "sha1"
+    legacy_digest = staticmethod(hashlib.sha1)
+
+
+class PBKDF2WrappedMD5PasswordHasher(PBKDF2WrappedPasswordHasher):
+    """Wrap hashes of Django's MD5PasswordHasher"""
+
+    algorithm = "pbkdf2_wrapped_md5"
+    legacy_algorithm = "md5"
+    legacy_digest = staticmethod(hashlib.md5)
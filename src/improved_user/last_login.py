@@ -0,0 +1,142 @@
+"""Throttled, buffered updates of User.last_login
+
+By default, Django saves ``last_login`` on every login: one ``UPDATE``
+of the user's row per login. If the
+``IMPROVED_USER_LAST_LOGIN_GRANULARITY`` setting is a number of
+seconds, logins instead:
+
+- do not record ``last_login`` again until that many seconds have
+  passed since the last recorded login;
+- record ``last_login`` in the cache (see :py:mod:`improved_user.cache`)
+  rather than the database.
+
+Buffered logins are written with one ``bulk_update`` by
+:func:`flush_last_login`, which the ``flush_last_login`` management
+command calls; run it periodically (for instance, every minute from
+cron). The cache must be shared by all processes (not ``locmem``):
+logins it evicts before they are flushed are lost.
+
+Django's password reset tokens are invalidated by a change of
+``last_login``. With the setting, a login changes it only once flushed,
+and not at all within the granularity of the previous login: a reset
+token issued before such a login stays valid until then (or until
+``PASSWORD_RESET_TIMEOUT``). Keep the granularity short, and flush
+often, where that matters.
+
+.. code:: python
+
+    IMPROVED_USER_LAST_LOGIN_GRANULARITY = 300  # five minutes
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import update_last_login as django_update
+from django.contrib.auth.signals import user_logged_in
+from django.utils import timezone
+
+from .cache import KEY_PREFIX, get_cache, invalidate_users
+
+
+def get_granularity():
+    """Return the setting as a timedelta, or None if not throttled"""
+    seconds = getattr(settings, "IMPROVED_USER_LAST_LOGIN_GRANULARITY", None)
+    if seconds is None:
+        return None
+    return timedelta(seconds=seconds)
+
+
+def _key(model, suffix):
+    """Return cache key of last_login buffer; helper function"""
+    return f"{KEY_PREFIX}:{model._meta.label_lower}:last_login:{suffix}"
+
+
+def update_last_login(sender, user, **kwargs):
+    """Throttle and buffer last_login updates; signal receiver
+
+    Replaces Django's receiver of the same name, and behaves as it does
+    unless ``IMPROVED_USER_LAST_LOGIN_GRANULARITY`` is set.
+    """
+    granularity = get_granularity()
+    if granularity is None:
+        return django_update(sender, user, **kwargs)
+    model = type(user)
+    cache = get_cache()
+    now = timezone.now()
+    last_login = cache.get(_key(model, f"user:{user.pk}")) or user.last_login
+    user.last_login = now
+    if last_login is not None and now - last_login < granularity:
+        return None
+    cache.set(_key(model, f"user:{user.pk}"), now, granularity.total_seconds())
+    # pending logins are numbered, as caches cannot list their keys; if
+    # the count was evicted, numbering resumes after the flushed logins
+    cache.add(_key(model, "count"), cache.get(_key(model, "flushed"), 0), None)
+    number = cache.incr(_key(model, "count"))
+    cache.set(_key(model, f"pending:{number}"), (user.pk, now), None)
+    return None
+
+
+def _read_pending(model, cache, numbers, settled):
+    """Return pending logins by pk, and the last number read
+
+    Stop before the first missing login that may still be written:
+    missing logins numbered up to ``settled`` were counted by the
+    previous flush, and have been evicted.
+    """
+    keys = [_key(model, f"pending:{number}") for number in numbers]
+    pending = cache.get_many(keys)
+    logins = {}
+    last = numbers[0] - 1
+    for number, key in zip(numbers, keys):
+        if key in pending:
+            pk, last_login = pending[key]
+            logins[pk] = max(last_login, logins.get(pk, last_login))
+        elif number > settled:
+            break
+        last = number
+    return logins, last
+
+
+def flush_last_login(model=None, batch_size=1000):
+    """Write buffered last_login values to the database
+
+    Return the number of users updated. Users are updated with
+    ``bulk_update`` (``save()`` is not called) and removed from cache.
+    A login being buffered while this runs is written by the next call.
+    """
+    model = model or get_user_model()
+    cache = get_cache()
+    flushed = cache.get(_key(model, "flushed"), 0)
+    settled = cache.get(_key(model, "settled"), 0)
+    count = cache.get(_key(model, "count"), 0)
+    if count < flushed:  # count and flushed were evicted
+        flushed = settled = 0
+    updated = 0
+    while flushed < count:
+        numbers = range(flushed + 1, min(flushed + batch_size, count) + 1)
+        logins, flushed = _read_pending(model, cache, numbers, settled)
+        users = [
+            model(pk=pk, last_login=last_login)
+            for pk, last_login in logins.items()
+        ]
+        model._default_manager.bulk_update(users, ["last_login"])
+        invalidate_users(model, list(logins))
+        cache.delete_many(
+            [
+                _key(model, f"pending:{number}")
+                for number in range(numbers[0], flushed + 1)
+            ]
+        )
+        cache.set(_key(model, "flushed"), flushed, None)
+        updated += len(users)
+        if flushed < numbers[-1]:
+            break
+    cache.set(_key(model, "settled"), count, None)
+    return updated
+
+
+def connect_signals():
+    """Replace Django's last_login receiver with update_last_login"""
+    user_logged_in.disconnect(dispatch_uid="update_last_login")
+    user_logged_in.connect(update_last_login, dispatch_uid="update_last_login")
@@ -0,0 +1,35 @@
+"""Write buffered last_login values of Improved Users to the database"""
+
+from django.core.management.base import BaseCommand
+
+from ...last_login import flush_last_login, get_granularity
+
+
+class Command(BaseCommand):
+    """Flush last_login values buffered in cache"""
+
+    help = (
+        "Write last_login values buffered in cache (when "
+        "IMPROVED_USER_LAST_LOGIN_GRANULARITY is set) to the database. "
+        "Run periodically."
+    )
+
+    def add_arguments(self, parser):
+        """Define batch size"""
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of users updated per query (default: 1000).",
+        )
+
+    def handle(self, *args, **options):
+        """Flush buffered logins; report how many users were updated"""
+        if get_granularity() is None and options["verbosity"] >= 1:
+            self.stderr.write(
+                "IMPROVED_USER_LAST_LOGIN_GRANULARITY is not set: "
+                "logins are not buffered."
+            )
+        updated = flush_last_login(batch_size=options["batch_size"])
+        if options["verbosity"] >= 1:
+            self.stdout.write(f"Updated last_login of {updated} users.")
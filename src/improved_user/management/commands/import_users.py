@@ -0,0 +1,218 @@
+"""Stream Improved Users from CSV or JSON Lines into the database"""
+
+import csv
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from time import perf_counter
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+from django.db.models.functions import Lower
+
+
+def read_csv(stream):
+    """Yield a dict per CSV row, omitting empty values"""
+    for row in csv.DictReader(stream):
+        yield {key: value for key, value in row.items() if value != ""}
+
+
+def read_jsonl(stream):
+    """Yield a dict per non-blank line of JSON"""
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+READERS = {"csv": read_csv, "jsonl": read_jsonl}
+
+#: Errors in reading, checking or saving records that may be resumed
+RECORD_ERRORS = (
+    csv.Error,
+    IntegrityError,
+    TypeError,
+    ValueError,  # including json.JSONDecodeError and UnicodeDecodeError
+    ValidationError,
+)
+
+
+class Command(BaseCommand):
+    """Import users in batches, skipping emails that already exist"""
+
+    help = (
+        "Create users from a CSV or JSON Lines file (or - for standard "
+        "input). Each record needs an email and may provide a raw "
+        "password and any other User field. Records are read as a "
+        "stream, deduplicated against existing users one batch at a "
+        "time, and each batch is saved in its own transaction."
+    )
+
+    def add_arguments(self, parser):
+        """Define input, batching and resumption options"""
+        parser.add_argument("path", help="File to import; - for stdin.")
+        parser.add_argument(
+            "--format",
+            choices=sorted(READERS),
+            help="Input format (default: from file extension, else csv).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of records per query and transaction "
+            "(default: 1000).",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Number of processes used to hash passwords.",
+        )
+        parser.add_argument(
+            "--skip",
+            type=int,
+            default=0,
+            help="Skip this many records; resume an interrupted import "
+            "from the last count reported.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Read and check records without saving users.",
+        )
+
+    def handle(self, *args, **options):
+        """Read records and import them batch by batch"""
+        path = options["path"]
+        input_format = options["format"] or (
+            "jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv"
+        )
+        workers = options["workers"]
+        # one pool hashes the passwords of every batch
+        executor = (
+            ProcessPoolExecutor(max_workers=workers)
+            if workers is not None and workers > 1 and not options["dry_run"]
+            else None
+        )
+        try:
+            if path == "-":
+                self.import_stream(sys.stdin, input_format, options, executor)
+            else:
+                with open(path, newline="", encoding="utf-8") as stream:
+                    self.import_stream(stream, input_format, options, executor)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+    def import_stream(self, stream, input_format, options, executor=None):
+        """Import records read from stream; report progress"""
+        User = get_user_model()  # pylint: disable=invalid-name
+        batch_size = options["batch_size"]
+        records = READERS[input_format](stream)
+        processed = options["skip"]
+        try:
+            for _ in islice(records, processed):
+                pass
+        except RECORD_ERRORS as error:
+            raise CommandError(
+                f"Could not read the {processed} records to skip: {error}."
+            ) from error
+        counts = {"created": 0, "existing": 0, "duplicate": 0}
+        start = perf_counter()
+        while True:
+            try:
+                batch = list(islice(records, batch_size))
+                if not batch:
+                    break
+                new, existing, duplicate = self.prepare(User, batch, processed)
+                if not options["dry_run"]:
+                    with transaction.atomic():
+                        # pylint: disable-next=protected-access
+                        User._default_manager.bulk_create_users(
+                            new,
+                            batch_size=batch_size,
+                            workers=options["workers"],
+                            executor=executor,
+                        )
+            except RECORD_ERRORS as error:
+                raise CommandError(
+                    f"Could not import the batch starting at record "
+                    f"{processed + 1}: {error}. No record of the batch was "
+                    f"saved; fix the input (or retry, if users were created "
+                    f"meanwhile) and resume with --skip {processed}."
+                ) from error
+            processed += len(batch)
+            counts["created"] += len(new)
+            counts["existing"] += existing
+            counts["duplicate"] += duplicate
+            if options["verbosity"] > 1:
+                self.stdout.write(f"Processed {processed} records.")
+        elapsed = perf_counter() - start
+        handled = processed - options["skip"]
+        rate = handled / elapsed if elapsed else 0
+        self.stdout.write(
+            f"{'Would create' if options['dry_run'] else 'Created'} "
+            f"{counts['created']} users; skipped {counts['existing']} "
+            f"existing and {counts['duplicate']} duplicate emails. "
+            f"Processed {handled} records in {elapsed:.2f}s "
+            f"({rate:.0f} records/s); {processed} records read in total."
+        )
+
+    def prepare(self, User, batch, offset):  # pylint: disable=invalid-name
+        """Normalize batch; return new records and skipped counts
+
+        Existing users are found with a single query per batch.
+        """
+        # pylint: disable-next=protected-access
+        manager = User._default_manager
+        email_field = User.get_email_field_name()
+        # pylint: disable-next=protected-access
+        case_insensitive = manager._email_case_insensitive()
+        fields = {
+            field.name: field
+            for field in User._meta.concrete_fields
+            if not field.primary_key
+        }
+        seen, duplicate = {}, 0
+        for number, record in enumerate(batch, start=offset + 1):
+            record = self.clean_record(record, fields, number)
+            email = manager.normalize_email(record.get(email_field))
+            if not email:
+                raise ValueError(f"record {number} has no {email_field}")
+            record[email_field] = email
+            key = email.lower() if case_insensitive else email
+            if key in seen:
+                duplicate += 1
+                continue
+            seen[key] = record
+        if case_insensitive:
+            existing = (
+                manager.annotate(_email_lower=Lower(email_field))
+                .filter(_email_lower__in=list(seen))
+                .values_list("_email_lower", flat=True)
+            )
+        else:
+            existing = manager.filter(
+                **{f"{email_field}__in": list(seen)}
+            ).values_list(email_field, flat=True)
+        existing = set(existing)
+        new = [record for key, record in seen.items() if key not in existing]
+        return new, len(existing), duplicate
+
+    @staticmethod
+    def clean_record(record, fields, number):
+        """Convert values of record to Python; keep raw password"""
+        if not isinstance(record, dict):
+            raise TypeError(f"record {number} is not an object")
+        cleaned = {}
+        for name, value in record.items():
+            if name == "password":
+                cleaned[name] = value
+            elif name in fields:
+                cleaned[name] = fields[name].to_python(value)
+            else:
+                raise ValueError(f"record {number} has unknown field {name!r}")
+        return cleaned
@@ -0,0 +1,42 @@
+"""Upgrade legacy password hashes of Improved Users ahead of logins"""
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    """Wrap legacy password hashes in batches"""
+
+    help = (
+        "Wrap legacy (SHA1, MD5) password hashes in PBKDF2, in batches, "
+        "so that logins do not have to upgrade them. Requires the hashers "
+        "of improved_user.hashers in PASSWORD_HASHERS."
+    )
+
+    def add_arguments(self, parser):
+        """Define batch size and number of worker processes"""
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of users read per query (default: 1000).",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Number of processes hashing passwords (default: 1).",
+        )
+
+    def handle(self, *args, **options):
+        """Upgrade hashes; report counts"""
+        User = get_user_model()  # pylint: disable=invalid-name
+        # pylint: disable-next=protected-access
+        upgraded, outdated = User._default_manager.upgrade_password_hashes(
+            batch_size=options["batch_size"], workers=options["workers"]
+        )
+        if options["verbosity"] >= 1:
+            self.stdout.write(
+                f"Upgraded {upgraded} password hashes; {outdated} other "
+                "outdated hashes can only be upgraded at login."
+            )
@@ -1,9 +1,241 @@
 """User Manager used by Improved User; may be extended"""
 
+import asyncio
+import os
+import threading
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice, repeat
+
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    UNUSABLE_PASSWORD_PREFIX,
+    get_hasher,
+    get_hashers,
+    make_password,
+)
 from django.contrib.auth.models import BaseUserManager
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import IntegrityError, connections, transaction
+from django.db.models import QuerySet, Value
+from django.db.models.functions import Lower
+from django.db.models.query import ModelIterable
+
+from .cache import (
+    get_cache,
+    get_timeout,
+    invalidate_users,
+    natural_key_key,
+    user_key,
+)
+from .search import search
+from .snapshots import UserSnapshotIterable, snapshot_fields
+
+
+def filter_by_email(queryset, email, case_insensitive=False):
+    """Filter queryset by email; compare lowercased if case-insensitive
+
+    Case-insensitive lookups compare ``LOWER(email)`` so that they may
+    be answered by a functional index on that expression.
+    """
+    field_name = queryset.model.get_email_field_name()
+    if case_insensitive:
+        return queryset.alias(_email_lower=Lower(field_name)).filter(
+            _email_lower=Lower(Value(email))
+        )
+    return queryset.filter(**{field_name: email})
+
+
+_HASH_EXECUTOR = None
+_HASH_EXECUTOR_LOCK = threading.Lock()
+
+
+def get_hash_executor():
+    """Return the thread pool that hashes passwords for async methods
+
+    Hashing is CPU-bound, so the pool is bounded: by the
+    ``IMPROVED_USER_HASH_WORKERS`` setting, or by the number of CPUs (at
+    most 4). The hashers in :py:mod:`hashlib` release the GIL, so
+    threads hash in parallel without blocking the event loop.
+    """
+    global _HASH_EXECUTOR  # pylint: disable=global-statement
+    with _HASH_EXECUTOR_LOCK:
+        if _HASH_EXECUTOR is None:
+            _HASH_EXECUTOR = ThreadPoolExecutor(
+                max_workers=getattr(
+                    settings,
+                    "IMPROVED_USER_HASH_WORKERS",
+                    min(4, os.cpu_count() or 1),
+                ),
+                thread_name_prefix="improved_user_hash",
+            )
+        return _HASH_EXECUTOR
+
+
+def _hash_password(hasher, password):
+    """Encode a raw password with hasher; helper for worker processes"""
+    return hasher.encode(password, hasher.salt())
+
+
+def _wrap_password(hasher, encoded):
+    """Wrap a legacy hash with hasher; helper for worker processes"""
+    return hasher.wrap(encoded)
+
+
+def _permission_names(field, pks, using):
+    """Map pks to the permissions of field (a ManyToManyField)
+
+    Permissions are named "app_label.codename", as by ModelBackend.
+    """
+    names = defaultdict(set)
+    if not pks:
+        return names
+    permission = field.m2m_reverse_field_name()
+    rows = (
+        field.remote_field.through._default_manager.using(using)
+        .filter(**{f"{field.m2m_field_name()}__in": pks})
+        .values_list(
+            field.m2m_field_name(),
+            f"{permission}__content_type__app_label",
+            f"{permission}__codename",
+        )
+        .order_by()
+    )
+    for pk, app_label, codename in rows:
+        names[pk].add(f"{app_label}.{codename}")
+    return names
+
+
+def _group_permission_names(field, pks, using):
+    """Map pks to the permissions of their groups; helper function"""
+    names = defaultdict(set)
+    if not pks:
+        return names
+    memberships = list(
+        field.remote_field.through._default_manager.using(using)
+        .filter(**{f"{field.m2m_field_name()}__in": pks})
+        .values_list(field.m2m_field_name(), field.m2m_reverse_field_name())
+        .order_by()
+    )
+    group_perms = _permission_names(
+        field.related_model._meta.get_field("permissions"),
+        {group_pk for _, group_pk in memberships},
+        using,
+    )
+    for pk, group_pk in memberships:
+        names[pk] |= group_perms[group_pk]
+    return names
+
+
+def _all_permission_names(permission_model, using):
+    """Return the names of all permissions; helper function"""
+    return {
+        f"{app_label}.{codename}"
+        for app_label, codename in permission_model._default_manager.using(
+            using
+        )
+        .values_list("content_type__app_label", "codename")
+        .order_by()
+    }
+
+
+def prefetch_permissions(users, using=None):
+    """Resolve the permissions of many users in a constant number of queries
+
+    Fills the permission caches Django's
+    :class:`~django.contrib.auth.backends.ModelBackend` keeps on each
+    user, so that ``has_perm()`` and ``get_all_permissions()`` do not
+    query the database. Return the permissions of each user by primary
+    key: inactive users have none, and superusers have all, as with
+    ModelBackend.
+
+    .. code:: python
+
+        users = list(User.objects.filter(is_staff=True))
+        prefetch_permissions(users)
+        editors = [user for user in users if user.has_perm("app.change_x")]
+    """
+    users = list(users)
+    if not users:
+        return {}
+    # pylint: disable=protected-access
+    opts = users[0]._meta
+    perms_field = opts.get_field("user_permissions")
+    active = [user for user in users if user.is_active]
+    pks = [user.pk for user in active if not user.is_superuser]
+    user_perms = _permission_names(perms_field, pks, using)
+    group_perms = _group_permission_names(opts.get_field("groups"), pks, using)
+    all_perms = set()
+    if len(pks) < len(active):
+        all_perms = _all_permission_names(perms_field.related_model, using)
+    result = {user.pk: set() for user in users}
+    for user in active:
+        if user.is_superuser:
+            user._user_perm_cache = set(all_perms)
+            user._group_perm_cache = set(all_perms)
+        else:
+            user._user_perm_cache = user_perms[user.pk]
+            user._group_perm_cache = group_perms[user.pk]
+        user._perm_cache = user._user_perm_cache | user._group_perm_cache
+        result[user.pk] = user._perm_cache
+    # pylint: enable=protected-access
+    return result
+
 
+class UserQuerySet(QuerySet):
+    """QuerySet of Users; returned by UserManager"""
 
-class UserManager(BaseUserManager):
+    _prefetch_permissions = False
+
+    def snapshots(self):
+        """Return a UserSnapshot of each User instead of instances
+
+        Snapshots are built from a ``values_list()`` query and hold only
+        the identity and flags of each user (see
+        :py:mod:`improved_user.snapshots`).
+
+        .. code:: python
+
+            User.objects.filter(is_active=True).snapshots()[:10000]
+        """
+        clone = self.values_list(*snapshot_fields(self.model))
+        clone._iterable_class = UserSnapshotIterable
+        return clone
+
+    def with_permissions(self):
+        """Resolve the permissions of Users when evaluated
+
+        Calls :func:`prefetch_permissions` on the Users fetched, so
+        that checking their permissions does not query the database.
+        As with ``prefetch_related()``, ``iterator()`` ignores it.
+
+        .. code:: python
+
+            users = User.objects.filter(is_staff=True).with_permissions()
+        """
+        clone = self._chain()
+        clone._prefetch_permissions = True
+        return clone
+
+    def _clone(self):
+        """Copy QuerySet, including with_permissions(); helper method"""
+        clone = super()._clone()
+        clone._prefetch_permissions = self._prefetch_permissions
+        return clone
+
+    def _fetch_all(self):
+        """Fetch results; resolve permissions if requested"""
+        fetched = self._result_cache is not None
+        super()._fetch_all()
+        if (
+            self._prefetch_permissions
+            and not fetched
+            and self._iterable_class is ModelIterable
+        ):
+            prefetch_permissions(self._result_cache, using=self.db)
+
+
+class UserManager(BaseUserManager.from_queryset(UserQuerySet)):
     """Manager for Users; overrides create commands for new fields
 
     Meant to be interacted with via the user model.
@@ -18,10 +250,130 @@ class UserManager(BaseUserManager):
     :attr:`~improved_user.models.AbstractUser`
     """
 
-    def _create_user(
-        self, email, password, is_staff, is_superuser, **extra_fields
-    ):
-        """Save a User with improved user fields; helper method"""
+    def _email_case_insensitive(self):
+        """Return True if email lookups ignore case; helper method
+
+        Enabled per model by ``EMAIL_CASE_INSENSITIVE = True``, or for
+        the project by the ``IMPROVED_USER_CASE_INSENSITIVE_EMAIL``
+        setting.
+        """
+        return getattr(self.model, "EMAIL_CASE_INSENSITIVE", False) or getattr(
+            settings, "IMPROVED_USER_CASE_INSENSITIVE_EMAIL", False
+        )
+
+    def _filter_by_email(self, email, case_insensitive=None):
+        """Return QuerySet of Users with email; helper method"""
+        if case_insensitive is None:
+            case_insensitive = self._email_case_insensitive()
+        return filter_by_email(self.get_queryset(), email, case_insensitive)
+
+    def _get_by_email(self, email, using=None):
+        """Get User by email; case-insensitive if enabled; helper method
+
+        Emails are only unique as written, so a case-insensitive lookup
+        may match several Users: the User with exactly this email is
+        returned, and ``MultipleObjectsReturned`` raised if there is
+        none.
+        """
+        queryset = self._filter_by_email(email)
+        if using is not None:
+            queryset = queryset.using(using)
+        users = list(queryset[:2])
+        if len(users) == 1:
+            return users[0]
+        if not users:
+            raise self.model.DoesNotExist(
+                f"{self.model._meta.object_name} matching query does not "
+                "exist."
+            )
+        exact = self._filter_by_email(email, case_insensitive=False)
+        if using is not None:
+            exact = exact.using(using)
+        users = list(exact)
+        if users:
+            return users[0]
+        raise self.model.MultipleObjectsReturned(
+            f"Several {self.model._meta.verbose_name_plural} match "
+            f"{email!r} when ignoring case, and none matches exactly."
+        )
+
+    def get_by_natural_key(self, username):
+        """Get User by email; case-insensitive if enabled on the model
+
+        If several Users match case-insensitively, only the User with
+        exactly this email is returned: if there is none,
+        ``DoesNotExist`` is raised, and authentication fails.
+        """
+        if (
+            self.model.USERNAME_FIELD == self.model.get_email_field_name()
+            and self._email_case_insensitive()
+        ):
+            try:
+                return self._get_by_email(username)
+            except self.model.MultipleObjectsReturned as error:
+                raise self.model.DoesNotExist(str(error)) from error
+        return super().get_by_natural_key(username)
+
+    def search(self, query):
+        """Return Users matching query, best matches first
+
+        Uses the full-text search index, if created and enabled (see
+        :py:mod:`improved_user.search`).
+
+        .. code:: python
+
+            User.objects.search("ada lov")[:20]
+        """
+        return search(self.get_queryset(), query)
+
+    def get_cached(self, pk):
+        """Get User by primary key; use cache to avoid querying
+
+        Raises ``DoesNotExist`` if there is no such User.
+        """
+        pk = self.model._meta.pk.to_python(pk)
+        cache = get_cache()
+        key = user_key(self.model, pk)
+        user = cache.get(key)
+        if user is None:
+            user = self.get(pk=pk)
+            cache.set(key, user, get_timeout())
+        return user
+
+    def get_by_natural_key_cached(self, username):
+        """Get User by natural key (email); use cache to avoid querying
+
+        The natural key maps to a primary key in cache; the User itself
+        is loaded with :meth:`get_cached`. Raises ``DoesNotExist`` if
+        there is no such User.
+        """
+        # keyed by the username as given: if emails differ only by
+        # case, each may be the exact match of a different User
+        cache = get_cache()
+        key = natural_key_key(self.model, username)
+        pk = cache.get(key)
+        if pk is not None:
+            try:
+                user = self.get_cached(pk)
+            except self.model.DoesNotExist:
+                pass
+            else:
+                cached_username = user.get_username()
+                if self._email_case_insensitive():
+                    matches = cached_username.lower() == username.lower()
+                else:
+                    matches = cached_username == username
+                if matches:
+                    return user
+        user = self.get_by_natural_key(username)
+        timeout = get_timeout()
+        cache.set_many(
+            {key: user.pk, user_key(self.model, user.pk): user}, timeout
+        )
+        return user
+
+    def _build_user(self, email, is_staff, is_superuser, **extra_fields):
+        """Instantiate (but do not save) a User; helper method"""
         if not email:
             raise ValueError("An email address must be provided.")
         if "username" in extra_fields:
@@ -29,12 +381,18 @@ class UserManager(BaseUserManager):
                 "The Improved User model does not have a username; "
                 "it uses only email"
             )
-        user = self.model(
+        return self.model(
             email=self.normalize_email(email),
             is_staff=is_staff,
             is_superuser=is_superuser,
             **extra_fields,
         )
+
+    def _create_user(
+        self, email, password, is_staff, is_superuser, **extra_fields
+    ):
+        """Save a User with improved user fields; helper method"""
+        user = self._build_user(email, is_staff, is_superuser, **extra_fields)
         user.set_password(password)
         user.save(using=self._db)
         return user
@@ -54,3 +412,444 @@ class UserManager(BaseUserManager):
         if extra_fields.get("is_superuser") is not True:
             raise ValueError("Superuser must have is_superuser=True.")
         return self._create_user(email, password, **extra_fields)
+
+    def get_or_create_user(self, email, password=None, defaults=None):
+        """Get the User with email, or create them; safe under races
+
+        Return a tuple of the User and whether they were created. The
+        email is normalized (and compared case-insensitively, if
+        enabled), and ``defaults`` are fields of a new User. The
+        password is only hashed if a User is created.
+
+        An existing User takes one query. A new User is inserted in a
+        savepoint: if a concurrent request inserted the same email
+        first, the unique constraint fails the insert, and that User is
+        fetched and returned instead of raising ``IntegrityError``.
+
+        Emails are only unique as written. With case-insensitive
+        lookups, concurrent calls with emails differing by case may
+        both create a User, unless the model has a unique constraint on
+        ``LOWER(email)`` (see
+        :class:`~improved_user.model_mixins.EmailAuthMixin`). If several
+        Users match and none has exactly this email,
+        ``MultipleObjectsReturned`` is raised.
+        """
+        email = self.normalize_email(email)
+        try:
+            return self._get_by_email(email), False
+        except self.model.DoesNotExist:
+            pass
+        extra_fields = {"is_staff": False, "is_superuser": False}
+        extra_fields.update(defaults or {})
+        user = self._build_user(email, **extra_fields)
+        user.set_password(password)
+        try:
+            with transaction.atomic(using=self.db):
+                user.save(using=self.db, force_insert=True)
+        except IntegrityError:
+            try:
+                return self._get_by_email(email, using=self.db), False
+            except self.model.DoesNotExist:
+                pass
+            raise
+        return user, True
+
+    async def _acreate_user(
+        self, email, password, is_staff, is_superuser, **extra_fields
+    ):
+        """Save a User asynchronously; helper method"""
+        user = self._build_user(email, is_staff, is_superuser, **extra_fields)
+        loop = asyncio.get_running_loop()
+        user.password = await loop.run_in_executor(
+            get_hash_executor(), make_password, password
+        )
+        # as set_password() does, so that password_changed() is called
+        user._password = password  # pylint: disable=protected-access
+        await user.asave(using=self._db)
+        return user
+
+    async def acreate_user(self, email=None, password=None, **extra_fields):
+        """Save new User with email and password; async version
+
+        The password is hashed in a bounded thread pool (see
+        :func:`get_hash_executor`) rather than on the event loop.
+        """
+        extra_fields.setdefault("is_staff", False)
+        extra_fields.setdefault("is_superuser", False)
+        return await self._acreate_user(email, password, **extra_fields)
+
+    async def acreate_superuser(self, email, password, **extra_fields):
+        """Save new superuser; async version of :meth:`create_superuser`"""
+        extra_fields.setdefault("is_staff", True)
+        extra_fields.setdefault("is_superuser", True)
+        if extra_fields.get("is_staff") is not True:
+            raise ValueError("Superuser must have is_staff=True.")
+        if extra_fields.get("is_superuser") is not True:
+            raise ValueError("Superuser must have is_superuser=True.")
+        return await self._acreate_user(email, password, **extra_fields)
+
+    def email_users(
+        self,
+        queryset,
+        subject,
+        message,
+        from_email=None,
+        chunk_size=1000,
+        connection=None,
+        fail_silently=False,
+        html_message=None,
+    ):
+        """Send an email to each User in queryset; return number sent
+
+        Each User receives their own message, so addresses are not
+        disclosed to other recipients. Addresses are streamed from the
+        database ``chunk_size`` at a time, and each chunk is sent over
+        a single (reused) email connection.
+
+        .. code:: python
+
+            User.objects.email_users(
+                User.objects.filter(is_active=True),
+                "Maintenance tonight",
+                "The site will be unavailable from 22:00 UTC.",
+            )
+        """
+        if queryset is None:
+            queryset = self.get_queryset()
+        emails = queryset.values_list(
+            self.model.get_email_field_name(), flat=True
+        ).iterator(chunk_size=chunk_size)
+        connection = connection or get_connection(fail_silently=fail_silently)
+        sent = 0
+        opened = connection.open()
+        try:
+            while True:
+                messages = []
+                for email in islice(emails, chunk_size):
+                    mail = EmailMultiAlternatives(
+                        subject, message, from_email, [email]
+                    )
+                    if html_message:
+                        mail.attach_alternative(html_message, "text/html")
+                    messages.append(mail)
+                if not messages:
+                    break
+                sent += connection.send_messages(messages) or 0
+        finally:
+            if opened:
+                connection.close()
+        return sent
+
+    def bulk_create_users(
+        self, users, batch_size=1000, workers=None, executor=None
+    ):
+        """Save many new Users at once; return the created Users
+
+        Accepts an iterable of mappings, each with the same keyword
+        arguments as :meth:`create_user` (``email``, ``password`` and
+        any other field). The iterable is consumed ``batch_size`` items
+        at a time: passwords in a batch are hashed (across ``workers``
+        processes, if more than one is requested), then the batch is
+        written with a single :meth:`~django.db.models.query.QuerySet.bulk_create`.
+
+        .. code:: python
+
+            User.objects.bulk_create_users(
+                (
+                    {"email": row["email"], "password": row["password"]}
+                    for row in rows
+                ),
+                batch_size=5000,
+                workers=4,
+            )
+
+        To hash passwords across calls with the same processes, pass an
+        ``executor`` (such as a
+        :class:`~concurrent.futures.ProcessPoolExecutor` of ``workers``
+        processes): it is used instead of a new pool, and not shut down.
+
+        As with ``bulk_create``, ``save()`` is not called and the
+        ``pre_save``/``post_save`` signals are not sent.
+        """
+        hasher = get_hasher()
+        iterator = iter(users)
+        created = []
+        chunksize = max(1, batch_size // (4 * (workers or 1)))
+        owned = executor is None and workers is not None and workers > 1
+        if owned:
+            executor = ProcessPoolExecutor(max_workers=workers)
+        try:
+            while True:
+                batch, passwords = [], []
+                for fields in islice(iterator, batch_size):
+                    fields = dict(fields)
+                    email = fields.pop("email", None)
+                    passwords.append(fields.pop("password", None))
+                    fields.setdefault("is_staff", False)
+                    fields.setdefault("is_superuser", False)
+                    batch.append(self._build_user(email, **fields))
+                if not batch:
+                    break
+                self._set_passwords(
+                    batch, passwords, hasher, executor, chunksize
+                )
+                created.extend(self.bulk_create(batch, batch_size=batch_size))
+        finally:
+            if owned:
+                executor.shutdown()
+        return created
+
+    def bulk_upsert(
+        self, records, key="email", update_fields=None, batch_size=1000
+    ):
+        """Create or update Users from records; return counts of each
+
+        Accepts an iterable of mappings of field names to values, each
+        identifying a User by the unique field ``key``. Records are
+        consumed ``batch_size`` at a time: the Users of a batch are
+        fetched with one query, and only new Users and Users whose
+        ``update_fields`` differ from the record are written: changed
+        Users with ``bulk_update()``, and new Users with ``INSERT ... ON
+        CONFLICT DO UPDATE`` (or, on databases without it,
+        ``bulk_create()``), in case they were created meanwhile.
+
+        .. code:: python
+
+            created, updated = User.objects.bulk_upsert(
+                directory_export,
+                update_fields=["full_name", "short_name", "is_active"],
+            )
+
+        ``update_fields`` defaults to all fields in the records (except
+        ``key`` and ``password``). Values are converted with each
+        field's ``to_python()``; fields missing from a record are left
+        unchanged. A ``password`` is only used for new Users. Users
+        deleted meanwhile are not recreated. As with
+        ``bulk_create``, ``save()`` is not called and signals are not
+        sent, but changed Users are removed from cache.
+        """
+        email_field = self.model.get_email_field_name()
+        case_insensitive = (
+            key == email_field and self._email_case_insensitive()
+        )
+        iterator = iter(records)
+        created = updated = 0
+        while True:
+            batch = {}
+            for record in islice(iterator, batch_size):
+                record = dict(record)
+                if key == email_field:
+                    record[key] = self.normalize_email(record[key])
+                lookup = (
+                    record[key].lower() if case_insensitive else record[key]
+                )
+                batch[lookup] = record
+            if not batch:
+                break
+            fields = list(update_fields or ())
+            if not fields:
+                fields = sorted(
+                    {name for record in batch.values() for name in record}
+                    - {key, "password"}
+                )
+            new, changed = self._diff_records(
+                batch, key, fields, case_insensitive
+            )
+            updated += self._write_upserts(
+                new, changed, key, fields, batch_size
+            )
+            invalidate_users(self.model, [user.pk for user in changed])
+            created += len(new)
+        return created, updated
+
+    def _clean_record(self, record):
+        """Convert values of record with to_python(); helper method"""
+        return {
+            name: (
+                value
+                if name == "password"
+                else self.model._meta.get_field(name).to_python(value)
+            )
+            for name, value in record.items()
+        }
+
+    def _diff_records(self, batch, key, fields, case_insensitive):
+        """Return new and changed Users of batch; helper method"""
+        queryset = self.get_queryset()
+        if case_insensitive:
+            queryset = queryset.annotate(_key=Lower(key)).filter(
+                _key__in=list(batch)
+            )
+        else:
+            queryset = queryset.filter(**{f"{key}__in": list(batch)})
+        existing = {
+            (row[key].lower() if case_insensitive else row[key]): row
+            for row in queryset.values("pk", key, *fields)
+        }
+        new, passwords, changed = [], [], []
+        for lookup, record in batch.items():
+            record = self._clean_record(record)
+            row = existing.get(lookup)
+            if row is None:
+                extra_fields = dict(record)
+                email = extra_fields.pop(
+                    self.model.get_email_field_name(), None
+                )
+                passwords.append(extra_fields.pop("password", None))
+                extra_fields.setdefault("is_staff", False)
+                extra_fields.setdefault("is_superuser", False)
+                new.append(self._build_user(email, **extra_fields))
+                continue
+            values = {name: record[name] for name in fields if name in record}
+            if any(row[name] != value for name, value in values.items()):
+                row.update(values)
+                changed.append(self.model(**row))
+        self._set_passwords(new, passwords, get_hasher())
+        return new, changed
+
+    def _write_upserts(self, new, changed, key, fields, batch_size):
+        """Insert new and update changed Users; helper method
+
+        Return the number of Users updated. Only new Users (with their
+        passwords) are upserted: changed Users are updated, so that
+        Users deleted meanwhile are not inserted without a password.
+        """
+        features = connections[self.db].features
+        if new and fields and features.supports_update_conflicts_with_target:
+            self.bulk_create(
+                new,
+                batch_size=batch_size,
+                update_conflicts=True,
+                unique_fields=[key],
+                update_fields=fields,
+            )
+        elif new:
+            # without fields to update, Users created meanwhile are kept
+            self.bulk_create(
+                new,
+                batch_size=batch_size,
+                ignore_conflicts=(
+                    not fields and features.supports_ignore_conflicts
+                ),
+            )
+        if not changed:
+            return 0
+        return self.bulk_update(changed, fields, batch_size=batch_size)
+
+    def upgrade_password_hashes(self, batch_size=1000, workers=None):
+        """Wrap legacy password hashes in batches; return counts
+
+        Users are read ``batch_size`` at a time, in order of primary
+        key. Hashes made by a legacy hasher that a configured hasher of
+        :py:mod:`improved_user.hashers` wraps are wrapped (across
+        ``workers`` processes, if more than one is requested) and
+        written with ``bulk_update()``; logins do not rehash wrapped
+        hashes.
+
+        Return a tuple of the number of hashes upgraded, and the number
+        of other outdated hashes (including unsalted legacy hashes),
+        which can only be upgraded with the raw password (at login).
+        """
+        wrappers = {}
+        for hasher in get_hashers():
+            if getattr(hasher, "legacy_algorithm", None):
+                wrappers.setdefault(hasher.legacy_algorithm, hasher)
+        upgraded = outdated = 0
+        queryset = self.get_queryset().order_by("pk")
+        batch = queryset
+        executor = (
+            ProcessPoolExecutor(max_workers=workers)
+            if workers is not None and workers > 1
+            else None
+        )
+        try:
+            while True:
+                rows = list(batch.values_list("pk", "password")[:batch_size])
+                if not rows:
+                    break
+                batch = queryset.filter(pk__gt=rows[-1][0])
+                legacy, count = self._find_outdated_hashes(rows, wrappers)
+                outdated += count
+                if legacy:
+                    upgraded += self._wrap_passwords(
+                        legacy, wrappers, executor
+                    )
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        return upgraded, outdated
+
+    @staticmethod
+    def _find_outdated_hashes(rows, wrappers):
+        """Return wrappable (pk, hash) rows, count of others; helper method
+
+        Unusable passwords, and hashes already wrapped, are ignored.
+        Unsalted hashes cannot be wrapped, and are counted.
+        """
+        preferred = get_hasher("default")
+        wrapped = {hasher.algorithm for hasher in wrappers.values()}
+        legacy, outdated = [], 0
+        for pk, encoded in rows:
+            if not encoded or encoded.startswith(UNUSABLE_PASSWORD_PREFIX):
+                continue
+            algorithm, _, rest = encoded.partition("$")
+            if algorithm in wrappers and not rest.startswith("$"):
+                legacy.append((pk, encoded))
+            elif algorithm in wrapped:
+                continue
+            elif algorithm != preferred.algorithm or preferred.must_update(
+                encoded
+            ):
+                outdated += 1
+        return legacy, outdated
+
+    def _wrap_passwords(self, legacy, wrappers, executor=None):
+        """Wrap and save legacy hashes; return count; helper method"""
+        hashers = [
+            wrappers[encoded.partition("$")[0]] for _, encoded in legacy
+        ]
+        encodeds = [encoded for _, encoded in legacy]
+        mapper = executor.map if executor is not None else map
+        upgrades = dict(zip(legacy, mapper(_wrap_password, hashers, encodeds)))
+        with transaction.atomic(using=self.db):
+            # skip users whose password changed while hashing
+            current = set(
+                self.get_queryset()
+                .using(self.db)
+                .select_for_update()
+                .filter(pk__in=[pk for pk, _ in legacy])
+                .values_list("pk", "password")
+            )
+            users = [
+                self.model(pk=pk, password=upgrade)
+                for (pk, encoded), upgrade in upgrades.items()
+                if (pk, encoded) in current
+            ]
+            self.bulk_update(users, ["password"])
+        invalidate_users(self.model, [user.pk for user in users])
+        return len(users)
+
+    @staticmethod
+    def _set_passwords(users, passwords, hasher, executor=None, chunksize=1):
+        """Hash raw passwords onto users; helper method
+
+        A raw password of None results in an unusable password, as
+        with :meth:`~django.contrib.auth.models.AbstractBaseUser.set_password`.
+        """
+        usable = [
+            (user, password)
+            for user, password in zip(users, passwords)
+            if password is not None
+        ]
+        raw = [password for _, password in usable]
+        if executor is not None:
+            encoded = executor.map(
+                _hash_password, repeat(hasher), raw, chunksize=chunksize
+            )
+        else:
+            encoded = map(_hash_password, repeat(hasher), raw)
+        for (user, _), password_hash in zip(usable, encoded):
+            user.password = password_hash
+        for user, password in zip(users, passwords):
+            if password is None:
+                user.password = make_password(None)
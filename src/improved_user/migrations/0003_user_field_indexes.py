@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("improved_user", "0002_case_insensitive_email_index"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="user",
+            index=models.Index(
+                condition=models.Q(("is_staff", True)),
+                fields=["is_staff"],
+                name="improved_user_user_staff_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="user",
+            index=models.Index(
+                fields=["is_active", "date_joined"],
+                name="improved_user_user_active_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="user",
+            index=models.Index(
+                fields=["date_joined"], name="improved_user_user_joined_idx"
+            ),
+        ),
+    ]
@@ -1,13 +1,39 @@
 """Mix-in Classes intended for use with Django Models"""
 
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, identify_hasher
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin
 from django.core.mail import send_mail
 from django.db import models
+from django.db.models.functions import Lower
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from .hashers import PBKDF2WrappedPasswordHasher
 from .managers import UserManager
 
+_EMAIL_EXECUTOR = None
+_EMAIL_EXECUTOR_LOCK = threading.Lock()
+
+
+def get_email_executor():
+    """Return the background thread that sends queued email
+
+    A single thread sends messages in the order they are queued, so
+    that request threads do not wait for the email server.
+    """
+    global _EMAIL_EXECUTOR  # pylint: disable=global-statement
+    with _EMAIL_EXECUTOR_LOCK:
+        if _EMAIL_EXECUTOR is None:
+            _EMAIL_EXECUTOR = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="improved_user_email"
+            )
+        return _EMAIL_EXECUTOR
+
 
 class DjangoIntegrationMixin(models.Model):
     """Mixin provides fields for Django integration to work correctly
@@ -36,6 +62,43 @@ class DjangoIntegrationMixin(models.Model):
     class Meta:
         abstract = True
 
+    class IndexedMeta:
+        """Meta options to index the fields of this mixin
+
+        Indexes staff (a partial index: staff are few), active users by
+        date joined, and date joined, as used by the admin list filters
+        and by join-date reports. Opt in by listing these indexes in the
+        Meta of the User model, alongside any indexes of your own.
+
+        .. code:: python
+
+            class User(AbstractUser):
+                class Meta(AbstractUser.Meta):
+                    indexes = [
+                        *DjangoIntegrationMixin.IndexedMeta.indexes,
+                    ]
+
+        Index names may be at most 30 characters long: if the app label
+        is longer than 13 characters, declare indexes with shorter
+        names instead.
+        """
+
+        indexes = [
+            models.Index(
+                fields=["is_staff"],
+                condition=models.Q(is_staff=True),
+                name="%(app_label)s_%(class)s_staff_idx",
+            ),
+            models.Index(
+                fields=["is_active", "date_joined"],
+                name="%(app_label)s_%(class)s_active_idx",
+            ),
+            models.Index(
+                fields=["date_joined"],
+                name="%(app_label)s_%(class)s_joined_idx",
+            ),
+        ]
+
 
 class FullNameMixin(models.Model):
     """A mixin to provide an optional full name field"""
@@ -71,9 +134,37 @@ class EmailAuthMixin(models.Model):
     class Meta:
         abstract = True
 
+    class CaseInsensitiveMeta:
+        """Meta options for case-insensitive email uniqueness
+
+        Opt in by inheriting from this class in the Meta of the User
+        model and setting :attr:`EMAIL_CASE_INSENSITIVE` to True.
+
+        .. code:: python
+
+            class User(AbstractUser):
+                EMAIL_CASE_INSENSITIVE = True
+
+                class Meta(
+                    AbstractUser.Meta, EmailAuthMixin.CaseInsensitiveMeta
+                ):
+                    pass
+        """
+
+        constraints = [
+            models.UniqueConstraint(
+                Lower("email"),
+                name="%(app_label)s_%(class)s_email_ci_uniq",
+            ),
+        ]
+
     EMAIL_FIELD = "email"
     USERNAME_FIELD = "email"
 
+    #: Look up users by email case-insensitively (see
+    #: :meth:`~improved_user.managers.UserManager.get_by_natural_key`)
+    EMAIL_CASE_INSENSITIVE = False
+
     def clean(self):
         """Override default clean method to normalize email.
 
@@ -83,9 +174,26 @@ class EmailAuthMixin(models.Model):
         super().clean()
         self.email = self.__class__.objects.normalize_email(self.email)
 
-    def email_user(self, subject, message, from_email=None, **kwargs):
-        """Send an email to this User."""
-        send_mail(subject, message, from_email, [self.email], **kwargs)
+    def email_user(
+        self, subject, message, from_email=None, background=False, **kwargs
+    ):
+        """Send an email to this User.
+
+        If ``background`` is True, queue the email to be sent by a
+        background thread (see :func:`get_email_executor`) and return a
+        :class:`~concurrent.futures.Future` of the result instead.
+        """
+        if background:
+            return get_email_executor().submit(
+                send_mail, subject, message, from_email, [self.email], **kwargs
+            )
+        return send_mail(subject, message, from_email, [self.email], **kwargs)
+
+    async def aemail_user(self, subject, message, from_email=None, **kwargs):
+        """Send an email to this User; async version of email_user"""
+        return await sync_to_async(send_mail, thread_sensitive=False)(
+            subject, message, from_email, [self.email], **kwargs
+        )
 
 
 # pylint: disable=too-many-ancestors
@@ -127,3 +235,30 @@ class AbstractUser(
         abstract = True
         verbose_name = _("user")
         verbose_name_plural = _("users")
+
+    def check_password(self, raw_password):
+        """Return True if raw_password is this User's password
+
+        As Django does, outdated hashes are upgraded (and the User
+        saved) when the password is correct, unless the
+        ``IMPROVED_USER_REHASH_ON_LOGIN`` setting is False. Legacy
+        hashes may instead be wrapped ahead of time, with
+        :meth:`~improved_user.managers.UserManager.upgrade_password_hashes`:
+        wrapped hashes are not rehashed at login.
+        """
+        if (
+            getattr(settings, "IMPROVED_USER_REHASH_ON_LOGIN", True)
+            and not self._has_wrapped_password()
+        ):
+            return super().check_password(raw_password)
+        return check_password(raw_password, self.password)
+
+    def _has_wrapped_password(self):
+        """Return True if a wrapping hasher made the hash; helper method"""
+        if not self.password:
+            return False
+        try:
+            hasher = identify_hasher(self.password)
+        except ValueError:
+            return False
+        return isinstance(hasher, PBKDF2WrappedPasswordHasher)
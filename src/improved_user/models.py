@@ -6,7 +6,10 @@ The UserManager is found in managers.py
 
 """
 
-from .model_mixins import AbstractUser
+from django.db import models
+from django.db.models.functions import Lower
+
+from .model_mixins import AbstractUser, DjangoIntegrationMixin
 
 
 # pylint: disable=too-many-ancestors
@@ -15,4 +18,21 @@ class User(AbstractUser):
 
     Do **not** import this model directly: use
     :py:func:`~django.contrib.auth.get_user_model`.
+
+    Email lookups are case-sensitive unless the
+    ``IMPROVED_USER_CASE_INSENSITIVE_EMAIL`` setting is True; the
+    ``LOWER(email)`` index serves case-insensitive lookups.
+
+    Staff, active users and join dates are indexed (see
+    :py:class:`~improved_user.model_mixins.DjangoIntegrationMixin.IndexedMeta`).
+    Email and names may be indexed for full-text search (see
+    :py:mod:`improved_user.search`).
     """
+
+    SEARCH_FIELDS = ("email", "full_name", "short_name")
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(Lower("email"), name="improved_user_email_lower_idx"),
+            *DjangoIntegrationMixin.IndexedMeta.indexes,
+        ]
@@ -0,0 +1,124 @@
+"""Password validators tuned for the Improved User model
+
+Drop-in replacements for Django's validators of the same name. Use them
+in ``AUTH_PASSWORD_VALIDATORS`` in place of Django's:
+
+.. code:: python
+
+    AUTH_PASSWORD_VALIDATORS = [
+        {
+            "NAME": "improved_user.password_validation."
+            "UserAttributeSimilarityValidator",
+        },
+        {
+            "NAME": "improved_user.password_validation."
+            "CommonPasswordValidator",
+        },
+    ]
+
+Django builds the configured validators once per process (see
+:func:`~django.contrib.auth.password_validation.get_default_password_validators`);
+these validators make each validation cheaper.
+"""
+
+import gzip
+import re
+from difflib import SequenceMatcher
+
+from django.contrib.auth import password_validation
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.utils.translation import gettext as _
+
+_PASSWORD_LISTS = {}
+
+
+def load_password_list(path):
+    """Return the (cached) set of passwords in the file at path
+
+    The file holds one lowercase password per line and may be gzipped.
+    Each file is read once per process, however many validators use it.
+    """
+    path = str(path)
+    if path not in _PASSWORD_LISTS:
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as password_file:
+                passwords = frozenset(line.strip() for line in password_file)
+        except OSError:
+            with open(path, encoding="utf-8") as password_file:
+                passwords = frozenset(line.strip() for line in password_file)
+        _PASSWORD_LISTS[path] = passwords
+    return _PASSWORD_LISTS[path]
+
+
+class CommonPasswordValidator(password_validation.CommonPasswordValidator):
+    """Validate that the password is not a common password
+
+    As Django's validator, but the password list is loaded into a
+    :class:`frozenset` shared by every instance.
+    """
+
+    # pylint: disable-next=super-init-not-called
+    def __init__(self, password_list_path=None):
+        """Load (or reuse) the set of common passwords"""
+        if password_list_path is None:
+            password_list_path = self.DEFAULT_PASSWORD_LIST_PATH
+        self.passwords = load_password_list(password_list_path)
+
+
+class UserAttributeSimilarityValidator(
+    password_validation.UserAttributeSimilarityValidator
+):
+    """Validate that the password differs from the user's email and names
+
+    As Django's validator, but compares against the fields of the
+    Improved User model by default (Django's default attributes are
+    mostly absent from it), and skips empty and repeated parts.
+    """
+
+    DEFAULT_USER_ATTRIBUTES = ("email", "full_name", "short_name")
+
+    def __init__(
+        self, user_attributes=DEFAULT_USER_ATTRIBUTES, max_similarity=0.7
+    ):
+        """Set the attributes to compare and the maximum similarity"""
+        super().__init__(user_attributes, max_similarity)
+
+    def validate(self, password, user=None):
+        """Raise ValidationError if password resembles a user attribute"""
+        if not user or not password:
+            return
+        password = password.lower()
+        compared = set()
+        for attribute_name in self.user_attributes:
+            value = getattr(user, attribute_name, None)
+            if not value or not isinstance(value, str):
+                continue
+            value = value.lower()
+            for part in (value, *re.split(r"\W+", value)):
+                if not part or part in compared:
+                    continue
+                compared.add(part)
+                if password_validation.exceeds_maximum_length_ratio(
+                    password, self.max_similarity, part
+                ):
+                    continue
+                if (
+                    SequenceMatcher(a=password, b=part).quick_ratio()
+                    >= self.max_similarity
+                ):
+                    self._raise_similar(user, attribute_name)
+
+    @staticmethod
+    def _raise_similar(user, attribute_name):
+        """Raise ValidationError naming the attribute; helper method"""
+        try:
+            verbose_name = str(
+                user._meta.get_field(attribute_name).verbose_name
+            )
+        except FieldDoesNotExist:
+            verbose_name = attribute_name
+        raise ValidationError(
+            _("The password is too similar to the %(verbose_name)s."),
+            code="password_too_similar",
+            params={"verbose_name": verbose_name},
+        )
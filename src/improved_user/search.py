@@ -0,0 +1,355 @@
+"""Full-text search over User email and names
+
+Searching names with ``icontains`` requires reading every row of the
+table. This module can maintain a search index on the email and name
+columns instead, and query it for ranked results:
+
+- on PostgreSQL, a GIN index on a ``tsvector`` expression;
+- on SQLite, an FTS5 table kept in sync by triggers.
+
+The index is optional. Improved User does not create it: add the
+:class:`CreateSearchIndex` operation to a migration of your own, then
+set ``IMPROVED_USER_SEARCH_INDEX = True``. Models list the indexed
+fields in ``SEARCH_FIELDS``. Without the setting, and on other
+databases, :func:`search` (and ``User.objects.search()``) falls back to
+``icontains`` lookups.
+
+.. code:: python
+
+    # migrations/0002_user_search_index.py (of one of your apps)
+    from improved_user.search import CreateSearchIndex
+
+    class Migration(migrations.Migration):
+        atomic = False  # PostgreSQL creates the index CONCURRENTLY
+        dependencies = [("improved_user", "0003_user_field_indexes")]
+        operations = [CreateSearchIndex("user", app_label="improved_user")]
+
+    # settings.py
+    IMPROVED_USER_SEARCH_INDEX = True
+
+Your own User model declares the fields it indexes:
+
+.. code:: python
+
+    class User(AbstractUser):
+        SEARCH_FIELDS = ("email", "full_name", "short_name")
+
+On PostgreSQL, the index is built without locking the table against
+writes (``CREATE INDEX CONCURRENTLY``), which cannot run in a
+transaction: the migration must set ``atomic = False``. On SQLite, the
+triggers only fire when an indexed column changes.
+
+.. WARNING::
+   On SQLite, migrations that alter the User table rebuild it, which
+   drops the triggers, and the index then silently falls behind. After
+   such migrations (including those of Improved User), add a
+   ``DropSearchIndex`` and a ``CreateSearchIndex`` to rebuild the index.
+"""
+
+import re
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import NotSupportedError, connections
+from django.db.migrations.operations.base import Operation
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+DEFAULT_SEARCH_FIELDS = ("email", "full_name", "short_name")
+
+
+def _tokenize(query):
+    """Split query into lowercase words; helper function"""
+    return re.findall(r"[^\W_]+", query.lower())
+
+
+def _columns(model, fields):
+    """Return database column names of fields; helper function"""
+    return [model._meta.get_field(name).column for name in fields]
+
+
+def has_search_index(model):
+    """Return True if search() may use the search index of model
+
+    The index is used on models with ``SEARCH_FIELDS`` once the
+    ``IMPROVED_USER_SEARCH_INDEX`` setting is enabled.
+    """
+    return bool(getattr(model, "SEARCH_FIELDS", None)) and getattr(
+        settings, "IMPROVED_USER_SEARCH_INDEX", False
+    )
+
+
+def search_table_name(model):
+    """Return the name of the SQLite FTS5 table of model"""
+    return f"{model._meta.db_table}_search"
+
+
+def search_index_name(model):
+    """Return the name of the PostgreSQL search index of model"""
+    return f"{model._meta.db_table}_search_idx"
+
+
+def _pg_vector(connection, model, fields, qualify=False):
+    """Return SQL of the tsvector indexed on PostgreSQL; helper function
+
+    The index and queries must use the same expression. Email
+    punctuation is replaced by spaces so that each part is a word.
+    """
+    quote = connection.ops.quote_name
+    table = f"{quote(model._meta.db_table)}." if qualify else ""
+    text = " || ' ' || ".join(
+        f"translate(coalesce({table}{quote(column)}, ''), '@.', '  ')"
+        for column in _columns(model, fields)
+    )
+    return f"to_tsvector('simple'::regconfig, {text})"
+
+
+def create_search_index(
+    schema_editor, model, fields=DEFAULT_SEARCH_FIELDS, concurrently=False
+):
+    """Create the search index of model, if supported by the database
+
+    On PostgreSQL, the index may be built ``concurrently``, without
+    blocking writes, outside of a transaction.
+    """
+    connection = schema_editor.connection
+    quote = connection.ops.quote_name
+    if connection.vendor == "postgresql":
+        schema_editor.execute(
+            f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}"
+            f"{quote(search_index_name(model))} "
+            f"ON {quote(model._meta.db_table)} USING gin "
+            f"({_pg_vector(connection, model, fields)})"
+        )
+    elif connection.vendor == "sqlite":
+        table = quote(model._meta.db_table)
+        search_table = quote(search_table_name(model))
+        pk_column = model._meta.pk.column
+        columns = [quote(column) for column in _columns(model, fields)]
+        column_list = ", ".join(columns)
+        new_values = ", ".join(f"new.{column}" for column in columns)
+        old_values = ", ".join(f"old.{column}" for column in columns)
+        delete = (
+            f"INSERT INTO {search_table}({search_table}, rowid, "
+            f"{column_list}) VALUES ('delete', old.{quote(pk_column)}, "
+            f"{old_values});"
+        )
+        insert = (
+            f"INSERT INTO {search_table}(rowid, {column_list}) "
+            f"VALUES (new.{quote(pk_column)}, {new_values});"
+        )
+        trigger = quote(search_table_name(model) + "_%s")
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {search_table} USING fts5("
+            f"{column_list}, content={table}, "
+            f"content_rowid={quote(pk_column)})"
+        )
+        for name, event, body in (
+            ("insert", "INSERT", insert),
+            ("delete", "DELETE", delete),
+            # only when indexed columns change, not on every login
+            ("update", f"UPDATE OF {column_list}", delete + " " + insert),
+        ):
+            schema_editor.execute(
+                f"CREATE TRIGGER {trigger % name} AFTER {event} ON {table} "
+                f"BEGIN {body} END"
+            )
+        schema_editor.execute(
+            f"INSERT INTO {search_table}({search_table}) VALUES ('rebuild')"
+        )
+
+
+def drop_search_index(schema_editor, model, concurrently=False):
+    """Drop the search index of model, if supported by the database"""
+    connection = schema_editor.connection
+    quote = connection.ops.quote_name
+    if connection.vendor == "postgresql":
+        schema_editor.execute(
+            f"DROP INDEX {'CONCURRENTLY ' if concurrently else ''}"
+            f"IF EXISTS {quote(search_index_name(model))}"
+        )
+    elif connection.vendor == "sqlite":
+        for name in ("insert", "delete", "update"):
+            schema_editor.execute(
+                "DROP TRIGGER IF EXISTS "
+                f"{quote(search_table_name(model) + '_' + name)}"
+            )
+        schema_editor.execute(
+            f"DROP TABLE IF EXISTS {quote(search_table_name(model))}"
+        )
+
+
+class CreateSearchIndex(Operation):
+    """Migration operation to create the search index of a model
+
+    The model belongs to the app of the migration, unless ``app_label``
+    names another app (such as ``"improved_user"``). On PostgreSQL, the
+    index is created concurrently: the migration must not be atomic.
+    """
+
+    reversible = True
+
+    def __init__(
+        self, model_name, fields=DEFAULT_SEARCH_FIELDS, app_label=None
+    ):
+        """Store the model, its app and the fields to index"""
+        self.model_name = model_name
+        self.fields = tuple(fields)
+        self.app_label = app_label
+
+    def state_forwards(self, app_label, state):
+        """Leave model state unchanged: the index is not a model option"""
+
+    def _model(self, app_label, schema_editor, state):
+        """Return the model if it may be migrated; helper method"""
+        connection = schema_editor.connection
+        if connection.vendor == "postgresql" and connection.in_atomic_block:
+            raise NotSupportedError(
+                f"The {self.__class__.__name__} operation cannot be executed "
+                "inside a transaction (set atomic = False on migration)."
+            )
+        model = state.apps.get_model(
+            self.app_label or app_label, self.model_name
+        )
+        if self.allow_migrate_model(connection.alias, model):
+            return model
+        return None
+
+    def database_forwards(
+        self, app_label, schema_editor, from_state, to_state
+    ):
+        """Create the index"""
+        model = self._model(app_label, schema_editor, to_state)
+        if model is not None:
+            create_search_index(
+                schema_editor, model, self.fields, concurrently=True
+            )
+
+    def database_backwards(
+        self, app_label, schema_editor, from_state, to_state
+    ):
+        """Drop the index"""
+        model = self._model(app_label, schema_editor, from_state)
+        if model is not None:
+            drop_search_index(schema_editor, model, concurrently=True)
+
+    def describe(self):
+        """Describe the operation for makemigrations and migrate"""
+        return f"Create search index on {self.model_name}"
+
+    @property
+    def migration_name_fragment(self):
+        """Suggest a migration name"""
+        return f"{self.model_name.lower()}_search_index"
+
+
+class DropSearchIndex(CreateSearchIndex):
+    """Migration operation to drop the search index of a model"""
+
+    def database_forwards(
+        self, app_label, schema_editor, from_state, to_state
+    ):
+        """Drop the index"""
+        super().database_backwards(
+            app_label, schema_editor, from_state, to_state
+        )
+
+    def database_backwards(
+        self, app_label, schema_editor, from_state, to_state
+    ):
+        """Create the index"""
+        super().database_forwards(
+            app_label, schema_editor, from_state, to_state
+        )
+
+    def describe(self):
+        """Describe the operation for makemigrations and migrate"""
+        return f"Drop search index on {self.model_name}"
+
+    @property
+    def migration_name_fragment(self):
+        """Suggest a migration name"""
+        return f"{self.model_name.lower()}_drop_search_index"
+
+
+def search(queryset, query):
+    """Filter queryset to Users matching every word of query
+
+    Each word matches the start of a word in the email or names, so
+    ``"ada lov"`` finds "Ada Lovelace". When the search index is used
+    (see :func:`has_search_index`), results are annotated with
+    ``search_rank`` (higher is a better match) and ordered by it.
+    """
+    words = _tokenize(query)
+    if not words:
+        return queryset.none()
+    model = queryset.model
+    fields = getattr(model, "SEARCH_FIELDS", None)
+    vendor = connections[queryset.db].vendor
+    if has_search_index(model) and vendor == "postgresql":
+        return _search_postgresql(queryset, fields, words)
+    if has_search_index(model) and vendor == "sqlite":
+        return _search_sqlite(queryset, words)
+    fields = [
+        name
+        for name in fields or DEFAULT_SEARCH_FIELDS
+        if any(field.name == name for field in model._meta.get_fields())
+    ]
+    for word in words:
+        queryset = queryset.filter(
+            reduce(or_, (Q(**{f"{name}__icontains": word}) for name in fields))
+        )
+    return queryset
+
+
+def _search_postgresql(queryset, fields, words):
+    """Search the GIN-indexed tsvector; helper function"""
+    connection = connections[queryset.db]
+    vector = _pg_vector(connection, queryset.model, fields, qualify=True)
+    tsquery = " & ".join(f"{word}:*" for word in words)
+    return (
+        queryset.filter(
+            RawSQL(
+                f"{vector} @@ to_tsquery('simple'::regconfig, %s)",
+                [tsquery],
+                output_field=BooleanField(),
+            )
+        )
+        .annotate(
+            search_rank=RawSQL(
+                f"ts_rank({vector}, to_tsquery('simple'::regconfig, %s))",
+                [tsquery],
+                output_field=FloatField(),
+            )
+        )
+        .order_by("-search_rank", "pk")
+    )
+
+
+def _search_sqlite(queryset, words):
+    """Search the FTS5 table; helper function"""
+    model = queryset.model
+    quote = connections[queryset.db].ops.quote_name
+    search_table = quote(search_table_name(model))
+    pk = f"{quote(model._meta.db_table)}.{quote(model._meta.pk.column)}"
+    match = " ".join(f'"{word}"*' for word in words)
+    return (
+        queryset.filter(
+            pk__in=RawSQL(
+                f"SELECT rowid FROM {search_table} "
+                f"WHERE {search_table} MATCH %s",
+                [match],
+            )
+        )
+        .annotate(
+            # FTS5 rank is bm25(), where lower is a better match
+            search_rank=RawSQL(
+                f"SELECT -rank FROM {search_table} "
+                f"WHERE {search_table} MATCH %s AND rowid = {pk}",
+                [match],
+                output_field=FloatField(),
+            )
+        )
+        .order_by("-search_rank", "pk")
+    )
@@ -0,0 +1,117 @@
+"""Compact, read-only representations of Improved Users
+
+Model instances carry state used to save them, track deferred fields,
+and cache relations and permissions. Pages that list thousands of users
+need none of it: :meth:`~improved_user.managers.UserQuerySet.snapshots`
+returns :class:`UserSnapshot` objects instead, built directly from the
+rows of a ``values_list()`` query.
+
+.. code:: python
+
+    for user in User.objects.filter(is_active=True).snapshots():
+        print(user.pk, user.email, user.get_full_name())
+"""
+
+from itertools import starmap
+
+from django.db.models import Value
+from django.db.models.query import ValuesListIterable
+
+
+class UserSnapshot:
+    """Read-only copy of the identity and flags of a User"""
+
+    __slots__ = (
+        "pk",
+        "email",
+        "full_name",
+        "short_name",
+        "is_active",
+        "is_staff",
+        "is_superuser",
+    )
+
+    #: Values of fields absent from the model
+    DEFAULTS = {
+        "full_name": "",
+        "short_name": "",
+        "is_active": True,
+        "is_staff": False,
+        "is_superuser": False,
+    }
+
+    # pylint: disable-next=too-many-arguments
+    def __init__(
+        self,
+        pk,
+        email,
+        full_name="",
+        short_name="",
+        is_active=True,
+        is_staff=False,
+        is_superuser=False,
+    ):
+        """Store the values of a User"""
+        set_value = object.__setattr__
+        set_value(self, "pk", pk)
+        set_value(self, "email", email)
+        set_value(self, "full_name", full_name)
+        set_value(self, "short_name", short_name)
+        set_value(self, "is_active", is_active)
+        set_value(self, "is_staff", is_staff)
+        set_value(self, "is_superuser", is_superuser)
+
+    def __setattr__(self, name, value):
+        """Forbid changes: snapshots are read-only"""
+        raise AttributeError(f"UserSnapshot is read-only; cannot set {name}")
+
+    def __delattr__(self, name):
+        """Forbid deletions: snapshots are read-only"""
+        raise AttributeError(
+            f"UserSnapshot is read-only; cannot delete {name}"
+        )
+
+    def __repr__(self):
+        """Represent snapshot with primary key and email"""
+        return f"<UserSnapshot pk={self.pk!r} email={self.email!r}>"
+
+    def __eq__(self, other):
+        """Compare snapshots by primary key"""
+        if not isinstance(other, UserSnapshot):
+            return NotImplemented
+        return self.pk == other.pk
+
+    def __hash__(self):
+        """Hash snapshot by primary key"""
+        return hash(self.pk)
+
+    def get_full_name(self):
+        """Return the full name of the user."""
+        return self.full_name
+
+    def get_short_name(self):
+        """Return the short name for the user."""
+        return self.short_name
+
+
+class UserSnapshotIterable(ValuesListIterable):
+    """Iterable yielding a UserSnapshot for each row"""
+
+    def __iter__(self):
+        """Build a snapshot from each row of values"""
+        return starmap(UserSnapshot, super().__iter__())
+
+
+def snapshot_fields(model):
+    """Return values_list() arguments for the slots of UserSnapshot
+
+    Fields absent from model are replaced by their default values.
+    """
+    names = {field.name for field in model._meta.get_fields()}
+    fields = ["pk", model.get_email_field_name()]
+    for name in UserSnapshot.__slots__[2:]:
+        if name in names:
+            fields.append(name)
+        else:
+            fields.append(Value(UserSnapshot.DEFAULTS[name]))
+    return fields
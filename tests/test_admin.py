@@ -2,18 +2,23 @@
 
 import os
 import re
+from unittest.mock import patch
 
 from django import VERSION as DJANGO_VERSION
+from django.contrib.admin import site
 from django.contrib.admin.models import LogEntry
 from django.contrib.auth import SESSION_KEY
-from django.test import TestCase, override_settings
+from django.contrib.auth.models import Permission
+from django.test import RequestFactory, TestCase, override_settings
 from django.urls import reverse
 from django.utils.encoding import force_str
 
-from improved_user.admin import UserAdmin
+from improved_user.admin import EstimatedCountPaginator, UserAdmin
 from improved_user.forms import UserChangeForm, UserCreationForm
 from improved_user.models import User
 
+from .test_search import SearchIndexMixin
+
 
 # Redirect in test_user_change_password will fail if session auth hash
 # isn't updated after password change (#21649)
@@ -288,3 +293,219 @@ class UserAdminTests(TestCase):
             )
             self.assertEqual(response.status_code, 400)
         self.assertEqual(len(logger_calls.output), 1, logger_calls.output)
+
+
+class HighScaleUserAdmin(UserAdmin):
+    """UserAdmin configured for very large tables"""
+
+    high_scale = True
+
+
+@override_settings(IMPROVED_USER_SEARCH_INDEX=True)
+class HighScaleUserAdminTests(SearchIndexMixin, TestCase):
+    """Test high-scale mode of UserAdmin"""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create users to search for"""
+        cls.ada = User.objects.create_user("Ada@example.com", full_name="Ada")
+        cls.alan = User.objects.create_user("alan@example.com")
+        User.objects.create_user("grace@example.com", full_name="Ada fan")
+
+    def setUp(self):
+        """Instantiate admin panels and a request"""
+        self.admin = HighScaleUserAdmin(User, site)
+        self.request = RequestFactory().get("/")
+
+    def search(self, model_admin, term):
+        """Return users found by the admin search; helper function"""
+        queryset, may_have_duplicates = model_admin.get_search_results(
+            self.request, User.objects.all(), term
+        )
+        self.assertFalse(may_have_duplicates)
+        return set(queryset)
+
+    def test_search_exact_email(self):
+        """Terms with @ match a single (normalized) email"""
+        self.assertEqual(
+            self.search(self.admin, "Ada@EXAMPLE.COM"), {self.ada}
+        )
+        self.assertEqual(self.search(self.admin, "ada@example.com"), set())
+
+    @override_settings(IMPROVED_USER_CASE_INSENSITIVE_EMAIL=True)
+    def test_search_exact_email_case_insensitive(self):
+        """Exact email search ignores case when enabled"""
+        self.assertEqual(
+            self.search(self.admin, "ada@example.com"), {self.ada}
+        )
+
+    def test_search_index(self):
+        """Other terms are looked up in the search index"""
+        self.assertEqual(self.search(self.admin, "al"), {self.alan})
+        self.assertEqual(len(self.search(self.admin, "ada")), 2)
+
+    @override_settings(IMPROVED_USER_SEARCH_INDEX=False)
+    def test_search_prefix(self):
+        """Without a search index, terms match an email prefix only"""
+        self.assertEqual(self.search(self.admin, "al"), {self.alan})
+        self.assertEqual(self.search(self.admin, "Ada"), {self.ada})
+        self.assertEqual(self.search(self.admin, "fan"), set())
+
+    def test_default_search(self):
+        """Without high-scale mode, names are searched too"""
+        self.assertEqual(len(self.search(UserAdmin(User, site), "Ada")), 2)
+
+    def test_full_result_count(self):
+        """Full result count is skipped in high-scale mode only"""
+        self.assertFalse(self.admin.show_full_result_count)
+        self.assertTrue(UserAdmin(User, site).show_full_result_count)
+
+    def test_paginator(self):
+        """Paginator counts rows unless an estimate is available"""
+        paginator = self.admin.get_paginator(
+            self.request, User.objects.order_by("pk"), 2
+        )
+        self.assertIsInstance(paginator, EstimatedCountPaginator)
+        self.assertIsNone(paginator.estimate_count())
+        self.assertEqual(paginator.count, 3)
+        self.assertNotIsInstance(
+            UserAdmin(User, site).get_paginator(
+                self.request, User.objects.order_by("pk"), 2
+            ),
+            EstimatedCountPaginator,
+        )
+
+    def test_paginator_estimate(self):
+        """Large estimates are used in place of counting rows"""
+        with patch.object(
+            EstimatedCountPaginator, "estimate_count", return_value=5000000
+        ):
+            paginator = EstimatedCountPaginator(
+                User.objects.order_by("pk"), 100
+            )
+            with self.assertNumQueries(0):
+                self.assertEqual(paginator.count, 5000000)
+                self.assertEqual(paginator.num_pages, 50000)
+        with patch.object(
+            EstimatedCountPaginator, "estimate_count", return_value=10
+        ):
+            paginator = EstimatedCountPaginator(
+                User.objects.order_by("pk"), 100
+            )
+            self.assertEqual(paginator.count, 3)
+
+    def test_no_estimate_when_filtered(self):
+        """Filtered querysets are never estimated"""
+        paginator = EstimatedCountPaginator(
+            User.objects.filter(is_staff=True).order_by("pk"), 100
+        )
+        self.assertIsNone(paginator.estimate_count())
+
+
+@override_settings(ROOT_URLCONF="tests.urls")
+class UserAdminActionsTests(TestCase):
+    """Test bulk actions of UserAdmin"""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create a superuser and users to act on"""
+        cls.admin = User.objects.create_superuser(
+            "admin@example.com", "password", full_name="Admin"
+        )
+        User.objects.bulk_create(
+            User(email=f"user{i}@example.com", is_staff=True, is_active=i < 4)
+            for i in range(5)
+        )
+
+    def setUp(self):
+        """Log in as the superuser"""
+        self.client.force_login(self.admin)
+
+    def act(self, action, **data):
+        """Run action on every user of the changelist; helper function"""
+        return self.client.post(
+            reverse("auth_test_admin:improved_user_user_changelist"),
+            {
+                "action": action,
+                "select_across": "1",
+                "index": "0",
+                "_selected_action": [self.admin.pk],
+                **data,
+            },
+            follow=True,
+        )
+
+    def test_actions_listed(self):
+        """Bulk actions are offered beside deletion"""
+        response = self.client.get(
+            reverse("auth_test_admin:improved_user_user_changelist")
+        )
+        choices = dict(
+            response.context["action_form"].fields["action"].choices
+        )
+        self.assertEqual(
+            choices["remove_superuser_status"],
+            "Remove superuser status of selected users",
+        )
+        self.assertIn("delete_selected", choices)
+
+    def test_deactivate(self):
+        """Users are updated and logged in chunks, except oneself"""
+        with patch.object(UserAdmin, "action_chunk_size", 2):
+            response = self.act("deactivate_users")
+        self.assertContains(response, "Deactivated 4 users.")
+        self.assertEqual(
+            list(User.objects.filter(is_active=True)), [self.admin]
+        )
+        entries = LogEntry.objects.filter(change_message__contains="Active")
+        self.assertEqual(entries.count(), 4)
+        self.assertEqual(
+            entries.first().get_change_message(), "Changed Active."
+        )
+        self.assertEqual(entries.first().user, self.admin)
+
+    def test_chunked_queries(self):
+        """Each chunk is read, updated and logged in one query each"""
+        admin = UserAdmin(User, site)
+        request = RequestFactory().post("/")
+        request.user = self.admin
+        with patch.object(UserAdmin, "action_chunk_size", 2):
+            # 3 chunks of 5 queries (read, savepoint, update, log,
+            # release), then a final empty read
+            with self.assertNumQueries(16):
+                count = admin.bulk_update_users(
+                    request, User.objects.all(), False, is_staff=False
+                )
+        self.assertEqual(count, 6)
+
+    def test_activate(self):
+        """Only inactive users are activated"""
+        self.assertContains(self.act("activate_users"), "Activated 1 user.")
+        self.assertFalse(User.objects.filter(is_active=False).exists())
+
+    def test_remove_staff_status(self):
+        """Staff status is removed from all but oneself"""
+        response = self.act("remove_staff_status")
+        self.assertContains(response, "Removed staff status of 5 users.")
+        self.assertEqual(
+            list(User.objects.filter(is_staff=True)), [self.admin]
+        )
+
+    def test_remove_superuser_status(self):
+        """Only superusers may remove superuser status"""
+        other = User.objects.create_superuser("other@example.com", "password")
+        response = self.act("remove_superuser_status")
+        self.assertContains(response, "Removed superuser status of 1 user.")
+        other.refresh_from_db()
+        self.assertFalse(other.is_superuser)
+        staff = User.objects.get(email="user0@example.com")
+        staff.user_permissions.set(Permission.objects.all())
+        self.client.force_login(staff)
+        response = self.client.get(
+            reverse("auth_test_admin:improved_user_user_changelist")
+        )
+        choices = dict(
+            response.context["action_form"].fields["action"].choices
+        )
+        self.assertNotIn("remove_superuser_status", choices)
+        self.assertIn("remove_staff_status", choices)
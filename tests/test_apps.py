@@ -0,0 +1,98 @@
+"""Test app configuration and startup of Improved User"""
+
+import json
+import subprocess
+import sys
+
+from django.contrib import admin
+from django.test import SimpleTestCase
+
+from improved_user.admin import UserAdmin
+from improved_user.models import User
+
+STARTUP_SCRIPT = """
+import json, sys
+
+import django
+from django.conf import settings
+from django.db.models.signals import post_save
+
+settings.configure(
+    INSTALLED_APPS={installed_apps!r},
+    AUTH_USER_MODEL="improved_user.User",
+    DATABASES={{"default": {{"ENGINE": "django.db.backends.sqlite3"}}}},
+)
+django.setup()
+receivers = [key for (key, _), *_ in post_save.receivers]
+json.dump({{"modules": sorted(sys.modules), "receivers": receivers}}, sys.stdout)
+"""
+
+APPS = [
+    "django.contrib.auth",
+    "django.contrib.contenttypes",
+    "improved_user.apps.ImprovedUserConfig",
+]
+ADMIN_APPS = [
+    "django.contrib.admin",
+    "django.contrib.messages",
+    "django.contrib.sessions",
+    *APPS,
+]
+
+
+def start_django(installed_apps):
+    """Set up Django in a new interpreter; helper function
+
+    Return the modules imported, and the dispatch_uid of post_save
+    receivers.
+    """
+    output = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            STARTUP_SCRIPT.format(installed_apps=installed_apps),
+        ],
+        capture_output=True,
+        check=True,
+        text=True,
+    ).stdout
+    startup = json.loads(output)
+    return startup["modules"], startup["receivers"]
+
+
+class ImprovedUserConfigTestCase(SimpleTestCase):
+    """Test ImprovedUserConfig.ready() and the modules it imports
+
+    Startup time is measured by the startup benchmark of
+    runbenchmarks.py rather than tested.
+    """
+
+    def test_admin_registered(self):
+        """The User model is registered with the admin if installed"""
+        self.assertIsInstance(admin.site._registry[User], UserAdmin)
+
+    def test_startup_without_admin(self):
+        """Admin and forms are not imported if the admin is not installed"""
+        modules, _ = start_django(APPS)
+        self.assertIn("improved_user.models", modules)
+        for module in (
+            "django.contrib.admin",
+            "django.contrib.auth.forms",
+            "improved_user.admin",
+            "improved_user.factories",
+            "improved_user.forms",
+        ):
+            with self.subTest(module=module):
+                self.assertNotIn(module, modules)
+
+    def test_startup_with_admin(self):
+        """Admin and forms are imported if the admin is installed"""
+        modules, _ = start_django(ADMIN_APPS)
+        self.assertIn("improved_user.admin", modules)
+        self.assertIn("improved_user.forms", modules)
+
+    def test_cache_invalidation_connected(self):
+        """Cached users are invalidated without loading the backends"""
+        modules, receivers = start_django(APPS)
+        self.assertNotIn("improved_user.backends", modules)
+        self.assertIn("improved_user_invalidate_user_on_save", receivers)
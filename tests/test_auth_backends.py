@@ -11,6 +11,8 @@ from django.contrib.auth.models import AnonymousUser, Group, Permission
 from django.contrib.contenttypes.models import ContentType
 from django.test import TestCase, modify_settings, override_settings
 
+from improved_user.backends import CachedModelBackend, CachedPermissionBackend
+from improved_user.cache import get_cache, invalidate_users
 from improved_user.models import User
 
 
@@ -306,3 +308,176 @@ class ImprovedUserModelBackendTest(TestCase):
         CountingMD5PasswordHasher.calls = 0
         authenticate(username="no_such_user", password="test")
         self.assertEqual(CountingMD5PasswordHasher.calls, 1)
+
+
+class CachedBackendSetupMixin:
+    """Use only the backend under test, with an empty cache"""
+
+    def setUp(self):
+        """Use only the cached backend; start with an empty cache"""
+        get_cache().clear()
+        self.patched_settings = override_settings(
+            AUTHENTICATION_BACKENDS=[self.backend],
+        )
+        self.patched_settings.enable()
+        self.create_users()
+
+    def tearDown(self):
+        """Remove patched settings and clear cache"""
+        super().tearDown()
+        get_cache().clear()
+
+
+class CachedModelBackendTest(
+    CachedBackendSetupMixin, ImprovedUserModelBackendTest
+):
+    """Run the ModelBackend tests against CachedModelBackend
+
+    Also check that users are served from (and evicted from) cache.
+    """
+
+    backend = "improved_user.backends.CachedModelBackend"
+
+    def test_get_user_cached(self):
+        """Second load of a user does not query the database"""
+        backend = CachedModelBackend()
+        with self.assertNumQueries(1):
+            self.assertEqual(backend.get_user(self.user.pk), self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(backend.get_user(str(self.user.pk)), self.user)
+        self.assertIsNone(backend.get_user(0))
+
+    def test_authenticate_cached(self):
+        """Authentication by email is served from cache"""
+        authenticate(email="test@example.com", password="test")
+        with self.assertNumQueries(0):
+            authenticated_user = authenticate(
+                email="test@example.com", password="test"
+            )
+        self.assertEqual(authenticated_user, self.user)
+        self.assertIsNone(authenticate(email="test@example.com", password="x"))
+
+    def test_save_invalidates_cache(self):
+        """Saving a user evicts the cached copy"""
+        backend = CachedModelBackend()
+        backend.get_user(self.user.pk)
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(backend.get_user(self.user.pk))
+
+    def test_email_change_invalidates_natural_key(self):
+        """A stale email does not authenticate the user"""
+        authenticate(email="test@example.com", password="test")
+        self.user.email = "new@example.com"
+        self.user.save()
+        self.assertIsNone(
+            authenticate(email="test@example.com", password="test")
+        )
+        self.assertEqual(
+            authenticate(email="new@example.com", password="test"), self.user
+        )
+
+    @override_settings(IMPROVED_USER_CASE_INSENSITIVE_EMAIL=True)
+    def test_emails_differing_by_case(self):
+        """Cached natural keys resolve to the exact email"""
+        other = User.objects.create_user("TEST@example.com", "other")
+        for _ in range(2):
+            self.assertEqual(
+                authenticate(email="test@example.com", password="test"),
+                self.user,
+            )
+            self.assertEqual(
+                authenticate(email="TEST@example.com", password="other"),
+                other,
+            )
+        self.assertIsNone(
+            authenticate(email="Test@example.com", password="test")
+        )
+
+    def test_delete_invalidates_cache(self):
+        """Deleting a user evicts the cached copy"""
+        backend = CachedModelBackend()
+        pk = self.user.pk
+        backend.get_user(pk)
+        self.user.delete()
+        self.assertIsNone(backend.get_user(pk))
+
+    def test_invalidate_users(self):
+        """Bulk updates are evicted with invalidate_users"""
+        backend = CachedModelBackend()
+        backend.get_user(self.user.pk)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertIsNotNone(backend.get_user(self.user.pk))
+        invalidate_users(User, [self.user.pk])
+        self.assertIsNone(backend.get_user(self.user.pk))
+
+
+class CachedPermissionBackendTest(
+    CachedBackendSetupMixin, ImprovedUserModelBackendTest
+):
+    """Run the ModelBackend tests against CachedPermissionBackend
+
+    Also check that permissions are shared across user instances and
+    invalidated when groups or permissions change.
+    """
+
+    backend = "improved_user.backends.CachedPermissionBackend"
+
+    def setUp(self):
+        """Create a permission granted by a group"""
+        super().setUp()
+        content_type = ContentType.objects.get_for_model(Group)
+        self.perm = Permission.objects.create(
+            name="cached", content_type=content_type, codename="cached"
+        )
+        self.group = Group.objects.create(name="cached_group")
+
+    def fresh_user(self):
+        """Reload user, so that instance caches are empty"""
+        return User.objects.get(pk=self.user.pk)
+
+    def test_permissions_shared_across_instances(self):
+        """Permissions are only queried for the first instance"""
+        self.user.user_permissions.add(self.perm)
+        user = self.fresh_user()
+        self.assertTrue(user.has_perm("auth.cached"))
+        user = self.fresh_user()
+        with self.assertNumQueries(0):
+            self.assertTrue(user.has_perm("auth.cached"))
+            self.assertFalse(user.has_perm("auth.other"))
+
+    def test_user_permissions_change(self):
+        """Adding and removing user permissions invalidates cache"""
+        self.assertFalse(self.fresh_user().has_perm("auth.cached"))
+        self.user.user_permissions.add(self.perm)
+        self.assertTrue(self.fresh_user().has_perm("auth.cached"))
+        self.perm.user_set.remove(self.user)
+        self.assertFalse(self.fresh_user().has_perm("auth.cached"))
+
+    def test_groups_change(self):
+        """Adding and clearing groups invalidates cache"""
+        self.group.permissions.add(self.perm)
+        self.assertFalse(self.fresh_user().has_perm("auth.cached"))
+        self.group.user_set.add(self.user)
+        self.assertTrue(self.fresh_user().has_perm("auth.cached"))
+        self.group.user_set.clear()
+        self.assertFalse(self.fresh_user().has_perm("auth.cached"))
+
+    def test_group_permissions_change(self):
+        """Changing the permissions of a group invalidates cache"""
+        self.user.groups.add(self.group)
+        self.assertFalse(self.fresh_user().has_perm("auth.cached"))
+        self.group.permissions.add(self.perm)
+        self.assertTrue(self.fresh_user().has_perm("auth.cached"))
+        self.group.delete()
+        self.assertFalse(self.fresh_user().has_perm("auth.cached"))
+
+    def test_backend_shares_instance_cache(self):
+        """Backend fills the instance caches ModelBackend uses"""
+        backend = CachedPermissionBackend()
+        self.user.user_permissions.add(self.perm)
+        backend.get_all_permissions(self.fresh_user())
+        user = self.fresh_user()
+        self.assertEqual(backend.get_all_permissions(user), {"auth.cached"})
+        self.assertEqual(user._user_perm_cache, {"auth.cached"})
+        self.assertEqual(user._group_perm_cache, set())
@@ -1,8 +1,10 @@
 """Test model factories provided by Improved User"""
 
-from django.test import TestCase
+from unittest.mock import patch
 
-from improved_user.factories import UserFactory
+from django.test import TestCase, override_settings
+
+from improved_user.factories import UserFactory, password_hash
 from improved_user.models import User
 
 
@@ -70,3 +72,109 @@ class UserFactoryTests(TestCase):
         self.assertIsInstance(user, User)
         self.assertTrue(user.check_password("my_secret_password87"))
         self.assertEqual(User.objects.all().count(), 1)
+
+    def test_bulk_create_batch(self):
+        """Users are saved with one INSERT per batch"""
+        # per batch, one SELECT of saved emails and one INSERT
+        with self.assertNumQueries(6):
+            users = UserFactory.bulk_create_batch(
+                25, batch_size=10, is_staff=True
+            )
+        self.assertEqual(len(users), 25)
+        self.assertEqual(User.objects.filter(is_staff=True).count(), 25)
+        self.assertEqual(len({user.email for user in users}), 25)
+        user = User.objects.get(email=users[0].email)
+        self.assertTrue(user.check_password("password!"))
+
+    def test_bulk_create_batch_unique_emails(self):
+        """Repeated generated emails are made unique"""
+        with patch.object(
+            UserFactory._meta.declarations["email"],
+            "evaluate",
+            return_value="same@example.com",
+        ):
+            users = UserFactory.bulk_create_batch(3, password="secret")
+        self.assertEqual(
+            sorted(User.objects.values_list("email", flat=True)),
+            ["1.same@example.com", "2.same@example.com", "same@example.com"],
+        )
+        self.assertTrue(users[2].check_password("secret"))
+
+    def test_bulk_create_batch_saved_emails(self):
+        """Generated emails already saved are made unique"""
+        UserFactory(email="same@example.com")
+        with patch.object(
+            UserFactory._meta.declarations["email"],
+            "evaluate",
+            return_value="same@example.com",
+        ):
+            UserFactory.bulk_create_batch(2, batch_size=1)
+        self.assertEqual(
+            sorted(User.objects.values_list("email", flat=True)),
+            ["1.same@example.com", "2.same@example.com", "same@example.com"],
+        )
+
+    def test_bulk_create_batch_count(self):
+        """Users may be counted rather than returned"""
+        self.assertEqual(
+            UserFactory.bulk_create_batch(
+                25, batch_size=10, return_users=False
+            ),
+            25,
+        )
+        self.assertEqual(User.objects.count(), 25)
+
+
+class PasswordHashTests(TestCase):
+    """Test reuse of password hashes by UserFactory"""
+
+    def test_hash_reused(self):
+        """Users with the same password share a precomputed hash"""
+        user1, user2 = UserFactory.build_batch(2)
+        self.assertEqual(user1.password, user2.password)
+        self.assertEqual(user1.password, password_hash("password!"))
+        user3 = UserFactory.build(password="another")
+        self.assertNotEqual(user1.password, user3.password)
+        self.assertTrue(user3.check_password("another"))
+
+    def test_unusable_password(self):
+        """An explicit password of None is unusable, as set_password(None)"""
+        user = UserFactory(password=None)
+        self.assertFalse(user.has_usable_password())
+        user.refresh_from_db()
+        self.assertFalse(user.has_usable_password())
+
+    @override_settings(
+        PASSWORD_HASHERS=[
+            "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+            "django.contrib.auth.hashers.MD5PasswordHasher",
+        ],
+        IMPROVED_USER_FACTORY_PASSWORD_HASHER="md5",
+    )
+    def test_fast_hasher_setting(self):
+        """Setting selects the hasher used by the factory"""
+        user = UserFactory()
+        self.assertTrue(user.password.startswith("md5$"))
+        self.assertTrue(user.check_password("password!"))
+
+    @override_settings(
+        PASSWORD_HASHERS=[
+            "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+            "django.contrib.auth.hashers.MD5PasswordHasher",
+        ],
+    )
+    def test_hasher_argument(self):
+        """Hasher may be selected per user"""
+        user = UserFactory.build(password__hasher="md5")
+        self.assertTrue(user.password.startswith("md5$"))
+        user = UserFactory.build()
+        self.assertTrue(user.password.startswith("pbkdf2_sha256$"))
+
+    def test_hashes_reset_when_hashers_change(self):
+        """Changing PASSWORD_HASHERS discards precomputed hashes"""
+        default_hash = password_hash("password!")
+        with self.settings(
+            PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"]
+        ):
+            self.assertTrue(password_hash("password!").startswith("md5$"))
+        self.assertNotEqual(password_hash("password!"), default_hash)
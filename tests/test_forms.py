@@ -5,6 +5,7 @@ from unittest.mock import patch
 from django import VERSION as DJANGO_VERSION
 from django.forms.fields import Field
 from django.test import TestCase, override_settings
+from django.utils import translation
 from django.utils.translation import gettext as _
 
 from improved_user.forms import UserChangeForm, UserCreationForm
@@ -55,6 +56,30 @@ class UserCreationFormTest(TestDataMixin, TestCase):
             form["email"].errors, [str(form.error_messages["duplicate_email"])]
         )
 
+    def test_user_already_exists_case_insensitive(self):
+        """Raise errors if user exists with email differing in case"""
+        data = {
+            "email": "TestClient@Example.com",
+            "password1": "test123",
+            "password2": "test123",
+        }
+        form = UserCreationForm(data)
+        self.assertFalse(form.is_valid())
+        self.assertEqual(
+            form["email"].errors, [str(form.error_messages["duplicate_email"])]
+        )
+
+    def test_email_uniqueness_single_query(self):
+        """Checking for duplicate emails takes a single query"""
+        data = {
+            "email": "jsmith@example.com",
+            "password1": "test123",
+            "password2": "test123",
+        }
+        form = UserCreationForm(data)
+        with self.assertNumQueries(1):
+            self.assertTrue(form.is_valid())
+
     def test_invalid_data(self):
         """Raise errors if invalid email format"""
         data = {
@@ -170,6 +195,35 @@ class UserCreationFormTest(TestDataMixin, TestCase):
             form["password1"].errors,
         )
 
+    def test_password_help_text_cached(self):
+        """Help text is rendered once per language and validators"""
+        with override_settings(
+            AUTH_PASSWORD_VALIDATORS=[
+                {
+                    "NAME": "django.contrib.auth.password_validation."
+                    "MinimumLengthValidator",
+                }
+            ]
+        ), patch(
+            "django.contrib.auth.password_validation.MinimumLengthValidator."
+            "get_help_text",
+            autospec=True,
+            return_value="Too short!",
+        ) as get_help_text:
+            for _i in range(3):
+                self.assertEqual(
+                    str(UserCreationForm().fields["password1"].help_text),
+                    "<ul><li>Too short!</li></ul>",
+                )
+            self.assertEqual(get_help_text.call_count, 1)
+            with translation.override("es"):
+                str(UserCreationForm().fields["password1"].help_text)
+            self.assertEqual(get_help_text.call_count, 2)
+        with override_settings(AUTH_PASSWORD_VALIDATORS=[]):
+            self.assertEqual(
+                str(UserCreationForm().fields["password1"].help_text), ""
+            )
+
     @override_settings(
         AUTH_PASSWORD_VALIDATORS=[
             {
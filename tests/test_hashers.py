@@ -0,0 +1,184 @@
+"""Test wrapping of legacy password hashes"""
+
+import hashlib
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth.hashers import (
+    check_password,
+    get_hasher,
+    make_password,
+)
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from improved_user.hashers import (
+    PBKDF2WrappedMD5PasswordHasher,
+    PBKDF2WrappedSHA1PasswordHasher,
+)
+from improved_user.models import User
+
+HASHERS = [
+    "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+    "improved_user.hashers.PBKDF2WrappedSHA1PasswordHasher",
+    "improved_user.hashers.PBKDF2WrappedMD5PasswordHasher",
+    "django.contrib.auth.hashers.MD5PasswordHasher",
+]
+
+
+def sha1_hash(password, salt="pepper"):
+    """Return a hash as Django's removed SHA1PasswordHasher made it"""
+    digest = hashlib.sha1((salt + password).encode()).hexdigest()
+    return f"sha1${salt}${digest}"
+
+
+@override_settings(PASSWORD_HASHERS=HASHERS)
+class WrappedPasswordHasherTestCase(TestCase):
+    """Test PBKDF2WrappedSHA1PasswordHasher and MD5 variant"""
+
+    def test_wrap_sha1(self):
+        """A wrapped SHA1 hash checks against the raw password"""
+        wrapped = PBKDF2WrappedSHA1PasswordHasher().wrap(sha1_hash("secret"))
+        self.assertTrue(wrapped.startswith("pbkdf2_wrapped_sha1$"))
+        self.assertTrue(check_password("secret", wrapped))
+        self.assertFalse(check_password("wrong", wrapped))
+
+    def test_wrap_md5(self):
+        """A wrapped MD5 hash checks against the raw password"""
+        legacy = make_password("secret", hasher="md5")
+        wrapped = PBKDF2WrappedMD5PasswordHasher().wrap(legacy)
+        self.assertTrue(check_password("secret", wrapped))
+
+    def test_wrap_other(self):
+        """Only hashes of the legacy algorithm may be wrapped"""
+        with self.assertRaisesMessage(
+            ValueError, "pbkdf2_wrapped_md5 cannot wrap sha1 password hashes"
+        ):
+            PBKDF2WrappedMD5PasswordHasher().wrap(sha1_hash("secret"))
+
+    def test_wrap_unsalted(self):
+        """Unsalted legacy hashes may not be wrapped"""
+        with self.assertRaisesMessage(
+            ValueError, "pbkdf2_wrapped_sha1 cannot wrap unsalted password"
+        ):
+            PBKDF2WrappedSHA1PasswordHasher().wrap(sha1_hash("secret", ""))
+
+
+@override_settings(PASSWORD_HASHERS=HASHERS)
+class UpgradePasswordHashesTestCase(TestCase):
+    """Test UserManager.upgrade_password_hashes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create users with legacy, current and outdated hashes"""
+        pbkdf2 = get_hasher("pbkdf2_sha256")
+        User.objects.bulk_create(
+            [
+                User(email="sha1@example.com", password=sha1_hash("one")),
+                User(
+                    email="md5@example.com",
+                    password=make_password("two", hasher="md5"),
+                ),
+                User(email="current@example.com", password=make_password("3")),
+                User(
+                    email="outdated@example.com",
+                    password=pbkdf2.encode("4", pbkdf2.salt(), 1000),
+                ),
+                User(
+                    email="unusable@example.com", password=make_password(None)
+                ),
+            ]
+        )
+
+    def test_upgrade(self):
+        """Legacy hashes are wrapped; other outdated hashes counted"""
+        # 3 batches read; 1 batch locked and written in a savepoint
+        with self.assertNumQueries(7):
+            result = User.objects.upgrade_password_hashes(batch_size=3)
+        self.assertEqual(result, (2, 1))
+        for email, password in (("sha1", "one"), ("md5", "two")):
+            user = User.objects.get(email=f"{email}@example.com")
+            self.assertTrue(
+                user.password.startswith(f"pbkdf2_wrapped_{email}$")
+            )
+            self.assertTrue(user.check_password(password))
+        self.assertEqual(User.objects.upgrade_password_hashes(), (0, 1))
+
+    def test_upgrade_with_workers(self):
+        """Hashes may be wrapped across a process pool"""
+        self.assertEqual(
+            User.objects.upgrade_password_hashes(workers=2), (2, 1)
+        )
+        user = User.objects.get(email="sha1@example.com")
+        self.assertTrue(check_password("one", user.password))
+
+    def test_password_changed_meanwhile(self):
+        """Passwords changed while hashing are not overwritten"""
+        wrap = PBKDF2WrappedSHA1PasswordHasher.wrap
+
+        def wrap_during_change(hasher, encoded):
+            User.objects.filter(email="sha1@example.com").update(
+                password=make_password("new")
+            )
+            return wrap(hasher, encoded)
+
+        with patch.object(
+            PBKDF2WrappedSHA1PasswordHasher, "wrap", wrap_during_change
+        ):
+            self.assertEqual(User.objects.upgrade_password_hashes(), (1, 1))
+        user = User.objects.get(email="sha1@example.com")
+        self.assertTrue(user.check_password("new"))
+
+    def test_unsalted(self):
+        """Unsalted legacy hashes are counted, not wrapped"""
+        md5 = hashlib.md5(b"five").hexdigest()
+        User.objects.bulk_create(
+            [
+                User(email="usha1@example.com", password=sha1_hash("5", "")),
+                User(email="umd5@example.com", password=f"md5$${md5}"),
+                User(email="bare@example.com", password=md5),
+            ]
+        )
+        self.assertEqual(User.objects.upgrade_password_hashes(), (2, 4))
+        self.assertEqual(
+            User.objects.get(email="umd5@example.com").password, f"md5$${md5}"
+        )
+        self.assertTrue(
+            User.objects.get(email="md5@example.com").password.startswith(
+                "pbkdf2_wrapped_md5$"
+            )
+        )
+
+    def test_login_keeps_wrapped(self):
+        """Logins do not rehash wrapped hashes"""
+        User.objects.upgrade_password_hashes()
+        user = User.objects.get(email="sha1@example.com")
+        wrapped = user.password
+        with self.assertNumQueries(0):
+            self.assertTrue(user.check_password("one"))
+        self.assertEqual(user.password, wrapped)
+
+    @override_settings(PASSWORD_HASHERS=HASHERS[:1] + HASHERS[3:])
+    def test_no_wrapping_hashers(self):
+        """Without wrapping hashers, legacy hashes are only counted"""
+        self.assertEqual(User.objects.upgrade_password_hashes(), (0, 3))
+
+    def test_command(self):
+        """The upgrade_password_hashes command upgrades hashes"""
+        out = StringIO()
+        call_command("upgrade_password_hashes", stdout=out)
+        self.assertEqual(
+            out.getvalue(),
+            "Upgraded 2 password hashes; 1 other outdated hashes can only "
+            "be upgraded at login.\n",
+        )
+
+    def test_rehash_on_login(self):
+        """Logins upgrade hashes unless disabled"""
+        user = User.objects.get(email="outdated@example.com")
+        with override_settings(IMPROVED_USER_REHASH_ON_LOGIN=False):
+            with self.assertNumQueries(0):
+                self.assertTrue(user.check_password("4"))
+        self.assertIn("$1000$", user.password)
+        self.assertTrue(user.check_password("4"))
+        self.assertNotIn("$1000$", user.password)
@@ -0,0 +1,157 @@
+"""Test throttled, buffered updates of last_login"""
+
+from datetime import datetime, timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth.signals import user_logged_in
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from improved_user.cache import get_cache
+from improved_user.last_login import _key, flush_last_login
+from improved_user.models import User
+
+NOW = datetime(2024, 6, 1, 12, 0)
+
+
+def log_in(user, moment):
+    """Send user_logged_in at moment; helper function"""
+    with patch("improved_user.last_login.timezone.now", return_value=moment):
+        user_logged_in.send(sender=User, request=None, user=user)
+
+
+class UnbufferedLastLoginTestCase(TestCase):
+    """Test last_login updates without the setting"""
+
+    def test_saved_on_login(self):
+        """last_login is saved on every login, as by Django"""
+        user = User.objects.create_user("hello@jambonsw.com", "password!")
+        self.assertTrue(
+            self.client.login(
+                username="hello@jambonsw.com", password="password!"
+            )
+        )
+        user.refresh_from_db()
+        self.assertIsNotNone(user.last_login)
+
+
+@override_settings(IMPROVED_USER_LAST_LOGIN_GRANULARITY=60)
+class BufferedLastLoginTestCase(TestCase):
+    """Test last_login updates with IMPROVED_USER_LAST_LOGIN_GRANULARITY"""
+
+    def setUp(self):
+        """Create users; start with an empty cache"""
+        get_cache().clear()
+        self.users = [
+            User.objects.create_user(f"user{i}@example.com") for i in range(3)
+        ]
+
+    def test_login_buffered(self):
+        """Logins do not write to the database until flushed"""
+        with self.assertNumQueries(0):
+            for user in self.users:
+                log_in(user, NOW)
+        self.assertEqual(self.users[0].last_login, NOW)
+        self.assertFalse(
+            User.objects.filter(last_login__isnull=False).exists()
+        )
+        with self.assertNumQueries(1):
+            self.assertEqual(flush_last_login(), 3)
+        self.assertEqual(User.objects.filter(last_login=NOW).count(), 3)
+        with self.assertNumQueries(0):
+            self.assertEqual(flush_last_login(), 0)
+
+    def test_login_throttled(self):
+        """Logins within the granularity are not recorded again"""
+        user = self.users[0]
+        log_in(user, NOW)
+        log_in(user, NOW + timedelta(seconds=30))
+        self.assertEqual(flush_last_login(), 1)
+        self.assertEqual(User.objects.get(pk=user.pk).last_login, NOW)
+        later = NOW + timedelta(seconds=61)
+        log_in(User.objects.get(pk=user.pk), later)
+        self.assertEqual(flush_last_login(), 1)
+        self.assertEqual(User.objects.get(pk=user.pk).last_login, later)
+
+    def test_throttled_by_database(self):
+        """Recent logins already saved are not recorded again"""
+        user = self.users[0]
+        User.objects.filter(pk=user.pk).update(last_login=NOW)
+        log_in(User.objects.get(pk=user.pk), NOW + timedelta(seconds=30))
+        self.assertEqual(flush_last_login(), 0)
+
+    def test_flush_batches(self):
+        """Buffered logins are written in batches"""
+        for user in self.users:
+            log_in(user, NOW)
+        with self.assertNumQueries(2):
+            self.assertEqual(flush_last_login(batch_size=2), 3)
+
+    def test_flush_invalidates_cache(self):
+        """Flushed users are removed from cache"""
+        user = self.users[0]
+        User.objects.get_cached(user.pk)
+        log_in(user, NOW)
+        flush_last_login()
+        self.assertEqual(User.objects.get_cached(user.pk).last_login, NOW)
+
+    def test_throttle_expires(self):
+        """The last recorded login is only kept for the granularity"""
+        cache = get_cache()
+        with patch.object(cache, "set", wraps=cache.set) as cache_set:
+            log_in(self.users[0], NOW)
+        cache_set.assert_any_call(
+            _key(User, f"user:{self.users[0].pk}"), NOW, 60
+        )
+
+    def test_flush_waits_for_pending(self):
+        """Logins counted but not yet buffered are flushed later"""
+        cache = get_cache()
+        cache.add(_key(User, "count"), 0, None)
+        cache.incr(_key(User, "count"))  # login 1 is being buffered
+        log_in(self.users[0], NOW)
+        self.assertEqual(flush_last_login(), 0)
+        cache.set(_key(User, "pending:1"), (self.users[1].pk, NOW), None)
+        self.assertEqual(flush_last_login(), 2)
+        self.assertEqual(User.objects.filter(last_login=NOW).count(), 2)
+
+    def test_flush_skips_evicted(self):
+        """Logins still missing at the next flush are skipped"""
+        for user in self.users:
+            log_in(user, NOW)
+        get_cache().delete(_key(User, "pending:2"))
+        self.assertEqual(flush_last_login(), 1)
+        self.assertEqual(flush_last_login(), 1)
+        self.assertEqual(
+            set(User.objects.filter(last_login=NOW)),
+            {self.users[0], self.users[2]},
+        )
+        self.assertEqual(flush_last_login(), 0)
+
+    def test_count_evicted(self):
+        """Numbering resumes after flushed logins if the count is evicted"""
+        log_in(self.users[0], NOW)
+        self.assertEqual(flush_last_login(), 1)
+        get_cache().delete(_key(User, "count"))
+        log_in(self.users[1], NOW)
+        self.assertEqual(flush_last_login(), 1)
+        self.assertEqual(User.objects.get(pk=self.users[1].pk).last_login, NOW)
+
+    def test_count_and_flushed_evicted(self):
+        """Logins are flushed if both count and flushed are evicted"""
+        log_in(self.users[0], NOW)
+        log_in(self.users[1], NOW)
+        self.assertEqual(flush_last_login(), 2)
+        get_cache().delete_many([_key(User, "count"), _key(User, "flushed")])
+        log_in(self.users[2], NOW)
+        self.assertEqual(flush_last_login(), 1)
+        self.assertEqual(User.objects.get(pk=self.users[2].pk).last_login, NOW)
+
+    def test_command(self):
+        """The flush_last_login command writes buffered logins"""
+        log_in(self.users[0], NOW)
+        out = StringIO()
+        call_command("flush_last_login", stdout=out)
+        self.assertEqual(out.getvalue(), "Updated last_login of 1 users.\n")
+        self.assertEqual(User.objects.get(pk=self.users[0].pk).last_login, NOW)
@@ -1,13 +1,23 @@
 """Test User model management commands"""
 
 import builtins
+import csv
+import json
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
 from io import StringIO
+from os.path import join
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
 
 from django.contrib.auth.management.commands import createsuperuser
 from django.core.management import call_command
 from django.core.management.base import CommandError
+from django.db import IntegrityError, connection
 from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 
+from improved_user.managers import UserManager
 from improved_user.models import User
 
 
@@ -176,3 +186,253 @@ class CreatesuperuserManagementCommandTestCase(TestCase):
             self.assertEqual(new_io.getvalue().strip(), expected_out)
 
         test(self)
+
+
+class ExportUsersManagementCommandTestCase(TestCase):
+    """Test export_users management command"""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create users to export"""
+        User.objects.create_user(
+            "ada@example.com",
+            "password",
+            full_name="Ada Lovelace",
+            short_name="Ada",
+            date_joined=datetime(2020, 1, 1),
+        )
+        User.objects.create_user(
+            "grace@example.com",
+            "password",
+            is_active=False,
+            date_joined=datetime(2021, 6, 1),
+        )
+        User.objects.create_superuser(
+            "admin@example.com",
+            "password",
+            date_joined=datetime(2022, 1, 1),
+        )
+
+    def export(self, *args):
+        """Run the command; return its output"""
+        out = StringIO()
+        call_command("export_users", *args, stdout=out)
+        return out.getvalue()
+
+    def test_csv(self):
+        """Default output is CSV with a header and no passwords"""
+        rows = list(csv.DictReader(StringIO(self.export())))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0]["email"], "ada@example.com")
+        self.assertEqual(rows[0]["full_name"], "Ada Lovelace")
+        self.assertTrue(
+            rows[0]["date_joined"].startswith("2020-01-01T00:00:00")
+        )
+        self.assertNotIn("password", rows[0])
+
+    def test_jsonl_fields(self):
+        """JSON Lines output with a selection of fields"""
+        output = self.export("--format=jsonl", "--fields=email, is_staff, ")
+        records = [json.loads(line) for line in output.splitlines()]
+        self.assertEqual(
+            records,
+            [
+                {"email": "ada@example.com", "is_staff": False},
+                {"email": "grace@example.com", "is_staff": False},
+                {"email": "admin@example.com", "is_staff": True},
+            ],
+        )
+
+    def test_filters(self):
+        """Users may be filtered by flags and join date"""
+        output = self.export("--format=jsonl", "--fields=email", "--active")
+        self.assertNotIn("grace@example.com", output)
+        output = self.export("--format=jsonl", "--fields=email", "--staff")
+        self.assertEqual(output, '{"email": "admin@example.com"}\n')
+        output = self.export(
+            "--format=jsonl",
+            "--fields=email",
+            "--joined-after=2021-01-01",
+            "--joined-before=2022-01-01",
+        )
+        self.assertEqual(output, '{"email": "grace@example.com"}\n')
+
+    def test_output_file(self):
+        """Users may be written to a UTF-8 file"""
+        User.objects.filter(email="ada@example.com").update(
+            full_name="Åda Lovelace"
+        )
+        with TemporaryDirectory() as directory:
+            path = join(directory, "users.csv")
+            self.export("--output", path, "--chunk-size=1")
+            with open(path, newline="", encoding="utf-8") as export:
+                rows = list(csv.DictReader(export))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0]["full_name"], "Åda Lovelace")
+
+    def test_password_not_exportable(self):
+        """Passwords and unknown fields are rejected"""
+        with self.assertRaisesMessage(CommandError, "password"):
+            self.export("--fields=email,password")
+        with self.assertRaisesMessage(CommandError, "nope"):
+            self.export("--fields=nope")
+        with self.assertRaisesMessage(CommandError, "Invalid date"):
+            self.export("--joined-after=yesterday")
+
+
+class ImportUsersManagementCommandTestCase(TestCase):
+    """Test import_users management command"""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create a user that already exists"""
+        User.objects.create_user("grace@example.com", "password")
+
+    def setUp(self):
+        """Provide a directory for input files"""
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def write(self, name, content):
+        """Write content to a file; return its path"""
+        path = join(self.directory, name)
+        with open(path, "w", newline="") as output:
+            output.write(content)
+        return path
+
+    def run_import(self, *args):
+        """Run the command; return its output"""
+        out = StringIO()
+        call_command("import_users", *args, stdout=out)
+        return out.getvalue()
+
+    @override_settings(
+        PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"]
+    )
+    def test_csv(self):
+        """Users are created in batches; existing and repeats skipped"""
+        path = self.write(
+            "users.csv",
+            "email,password,full_name,is_staff\n"
+            "ada@EXAMPLE.com,secret,Ada Lovelace,True\n"
+            "grace@example.com,secret,Grace Hopper,\n"
+            "alan@example.com,,Alan Turing,False\n"
+            "ada@example.com,other,Ada Again,False\n",
+        )
+        with CaptureQueriesContext(connection) as context:
+            output = self.run_import(path)
+        statements = [
+            query["sql"].split()[0]
+            for query in context.captured_queries
+            if "SAVEPOINT" not in query["sql"]
+        ]
+        self.assertEqual(statements, ["SELECT", "INSERT"])
+        self.assertIn("Created 2 users", output)
+        self.assertIn("skipped 1 existing and 1 duplicate", output)
+        ada = User.objects.get(email="ada@example.com")
+        self.assertTrue(ada.check_password("secret"))
+        self.assertTrue(ada.is_staff)
+        self.assertEqual(ada.full_name, "Ada Lovelace")
+        alan = User.objects.get(email="alan@example.com")
+        self.assertFalse(alan.has_usable_password())
+
+    def test_batches(self):
+        """Each batch is checked against users saved by earlier ones"""
+        path = self.write(
+            "users.csv",
+            "email\nada@example.com\ngrace@example.com\nada@example.com\n",
+        )
+        output = self.run_import(path, "--batch-size=2", "--verbosity=2")
+        self.assertIn("Processed 2 records.", output)
+        self.assertIn("Created 1 users; skipped 2 existing", output)
+
+    @override_settings(
+        PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"]
+    )
+    def test_workers(self):
+        """One process pool hashes the passwords of all batches"""
+        path = self.write(
+            "users.csv",
+            "email,password\n"
+            "ada@example.com,one\n"
+            "alan@example.com,two\n"
+            "anita@example.com,three\n",
+        )
+        with patch(
+            "improved_user.management.commands.import_users."
+            "ProcessPoolExecutor",
+            wraps=ProcessPoolExecutor,
+        ) as command_pool, patch(
+            "improved_user.managers.ProcessPoolExecutor",
+            wraps=ProcessPoolExecutor,
+        ) as manager_pool:
+            output = self.run_import(path, "--batch-size=1", "--workers=2")
+        command_pool.assert_called_once_with(max_workers=2)
+        manager_pool.assert_not_called()
+        self.assertIn("Created 3 users", output)
+        user = User.objects.get(email="anita@example.com")
+        self.assertTrue(user.check_password("three"))
+
+    def test_jsonl_skip(self):
+        """JSON Lines input; resume by skipping records"""
+        path = self.write(
+            "users.jsonl",
+            '{"email": "ada@example.com"}\n'
+            "\n"
+            '{"email": "alan@example.com", "short_name": "Alan"}\n',
+        )
+        output = self.run_import(path, "--skip=1")
+        self.assertIn("Created 1 users", output)
+        self.assertIn("2 records read in total", output)
+        self.assertEqual(
+            User.objects.get(email="alan@example.com").short_name, "Alan"
+        )
+        self.assertFalse(User.objects.filter(email="ada@example.com").exists())
+
+    def test_dry_run(self):
+        """Dry run reports, but does not create users"""
+        path = self.write("users.csv", "email\nada@example.com\n")
+        output = self.run_import(path, "--dry-run")
+        self.assertIn("Would create 1 users", output)
+        self.assertIn("records/s", output)
+        self.assertEqual(User.objects.count(), 1)
+
+    @override_settings(IMPROVED_USER_CASE_INSENSITIVE_EMAIL=True)
+    def test_case_insensitive(self):
+        """Existing emails are matched ignoring case if enabled"""
+        path = self.write("users.csv", "email\nGRACE@example.com\n")
+        output = self.run_import(path)
+        self.assertIn("Created 0 users; skipped 1 existing", output)
+
+    def test_invalid_records(self):
+        """Errors report the records to fix and how to resume"""
+        path = self.write("users.csv", "email,nickname\nada@example.com,Ada\n")
+        with self.assertRaisesMessage(CommandError, "--skip 0"):
+            self.run_import(path)
+        path = self.write("users.jsonl", '{"short_name": "Ada"}\n')
+        with self.assertRaisesMessage(CommandError, "has no email"):
+            self.run_import(path)
+        self.assertEqual(User.objects.count(), 1)
+
+    def test_malformed_records(self):
+        """Unreadable records report how to resume"""
+        path = self.write(
+            "users.jsonl", '{"email": "ada@example.com"}\n{bad\n'
+        )
+        with self.assertRaisesMessage(CommandError, "--skip 1"):
+            self.run_import(path, "--batch-size=1")
+        self.assertTrue(User.objects.filter(email="ada@example.com").exists())
+        with self.assertRaisesMessage(CommandError, "records to skip"):
+            self.run_import(path, "--skip=2")
+
+    def test_integrity_error(self):
+        """Users created concurrently report how to resume"""
+        path = self.write("users.csv", "email\nada@example.com\n")
+        with patch.object(
+            UserManager,
+            "bulk_create_users",
+            side_effect=IntegrityError("UNIQUE constraint failed"),
+        ):
+            with self.assertRaisesMessage(CommandError, "--skip 0"):
+                self.run_import(path)
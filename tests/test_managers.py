@@ -1,11 +1,24 @@
 """Test User model manager"""
 
+import threading
 from datetime import datetime
+from unittest.mock import patch
 
-from django.test import TestCase
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, Permission
+from django.core import mail
+from django.db import IntegrityError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 
-from improved_user.managers import UserManager
+from improved_user.managers import (
+    UserManager,
+    get_hash_executor,
+    prefetch_permissions,
+)
 from improved_user.models import User
+from improved_user.snapshots import UserSnapshot
 
 
 class UserManagerTestCase(TestCase):
@@ -120,3 +133,594 @@ class UserManagerTestCase(TestCase):
         user2 = User.objects.create_superuser("clark@kent.com", "password1")
         self.assertIsNotNone(user2.date_joined)
         self.assertIsInstance(user2.date_joined, datetime)
+
+
+@override_settings(
+    PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"]
+)
+class BulkCreateUsersTestCase(TestCase):
+    """Test UserManager.bulk_create_users"""
+
+    def test_bulk_create_users(self):
+        """Users are normalized, hashed and saved in batches"""
+        rows = (
+            {"email": f"user{i}@EXAMPLE.COM", "password": f"secret{i}"}
+            for i in range(5)
+        )
+        with self.assertNumQueries(3):
+            users = User.objects.bulk_create_users(rows, batch_size=2)
+        self.assertEqual(len(users), 5)
+        self.assertEqual(User.objects.count(), 5)
+        user = User.objects.get(email="user3@example.com")
+        self.assertTrue(user.check_password("secret3"))
+        self.assertFalse(user.is_staff)
+        self.assertFalse(user.is_superuser)
+
+    def test_bulk_create_users_with_workers(self):
+        """Passwords may be hashed across a process pool"""
+        rows = [
+            {"email": f"user{i}@example.com", "password": f"secret{i}"}
+            for i in range(4)
+        ]
+        User.objects.bulk_create_users(rows, workers=2)
+        for i in range(4):
+            user = User.objects.get(email=f"user{i}@example.com")
+            self.assertTrue(user.check_password(f"secret{i}"))
+
+    def test_bulk_create_users_unusable_password(self):
+        """Omitting a password results in an unusable password"""
+        User.objects.bulk_create_users(
+            [{"email": "hello@jambonsw.com", "short_name": "Andrew"}]
+        )
+        user = User.objects.get(email="hello@jambonsw.com")
+        self.assertEqual(user.short_name, "Andrew")
+        self.assertFalse(user.has_usable_password())
+
+    def test_bulk_create_users_validation(self):
+        """Same validation as create_user"""
+        with self.assertRaisesMessage(
+            ValueError, "An email address must be provided."
+        ):
+            User.objects.bulk_create_users([{"password": "test"}])
+        with self.assertRaisesMessage(
+            ValueError,
+            "The Improved User model does not have a username; "
+            "it uses only email",
+        ):
+            User.objects.bulk_create_users(
+                [{"email": "test@test.com", "username": "whoops"}]
+            )
+        self.assertEqual(User.objects.count(), 0)
+
+
+class AsyncUserManagerTestCase(TestCase):
+    """Test asynchronous UserManager methods"""
+
+    async def test_acreate_user(self):
+        """Create a user asynchronously, hashing off the event loop"""
+        threads = []
+
+        def recording_make_password(*args, **kwargs):
+            threads.append(threading.current_thread())
+            return make_password(*args, **kwargs)
+
+        with patch(
+            "improved_user.managers.make_password", recording_make_password
+        ):
+            user = await User.objects.acreate_user(
+                "Hello@JAMBONSW.COM", "password!", short_name="Andrew"
+            )
+        self.assertEqual(len(threads), 1)
+        self.assertTrue(threads[0].name.startswith("improved_user_hash"))
+        user = await User.objects.aget(pk=user.pk)
+        self.assertEqual(user.email, "Hello@jambonsw.com")
+        self.assertEqual(user.short_name, "Andrew")
+        self.assertTrue(user.check_password("password!"))
+        self.assertFalse(user.is_staff)
+        self.assertFalse(user.is_superuser)
+
+    async def test_acreate_user_unusable_password(self):
+        """Omitting a password results in an unusable password"""
+        user = await User.objects.acreate_user("hello@jambonsw.com")
+        self.assertFalse(user.has_usable_password())
+
+    async def test_acreate_user_password_changed(self):
+        """Password validators are notified of the new password"""
+        with patch(
+            "django.contrib.auth.password_validation.password_changed"
+        ) as password_changed:
+            await User.objects.acreate_user("hello@jambonsw.com", "secret!")
+        password_changed.assert_called_once()
+
+    async def test_acreate_superuser(self):
+        """Create a superuser asynchronously"""
+        user = await User.objects.acreate_superuser(
+            "admin@example.com", "password!"
+        )
+        self.assertTrue(user.is_staff)
+        self.assertTrue(user.is_superuser)
+        with self.assertRaisesMessage(
+            ValueError, "Superuser must have is_staff=True."
+        ):
+            await User.objects.acreate_superuser(
+                "other@example.com", "password!", is_staff=False
+            )
+        with self.assertRaisesMessage(
+            ValueError, "An email address must be provided."
+        ):
+            await User.objects.acreate_superuser(None, "password!")
+
+    def test_hash_executor_bounded(self):
+        """The hashing thread pool is shared and bounded"""
+        executor = get_hash_executor()
+        self.assertIs(executor, get_hash_executor())
+        self.assertLessEqual(executor._max_workers, 4)
+
+
+class BulkUpsertTestCase(TestCase):
+    """Test UserManager.bulk_upsert"""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create users to be synchronized"""
+        User.objects.bulk_create(
+            User(email=f"user{i}@example.com", full_name=f"User {i}")
+            for i in range(4)
+        )
+
+    def records(self):
+        """Return directory records: 2 changed, 2 unchanged, 1 new"""
+        return [
+            {"email": "user0@EXAMPLE.COM", "full_name": "User 0"},
+            {"email": "user1@example.com", "full_name": "Renamed 1"},
+            {"email": "user2@example.com", "full_name": "User 2"},
+            {"email": "user3@example.com", "is_active": "False"},
+            {
+                "email": "new@example.com",
+                "full_name": "New",
+                "password": "pass!",
+            },
+        ]
+
+    def assert_synchronized(self):
+        """Check users match records; helper method"""
+        self.assertEqual(User.objects.count(), 5)
+        self.assertEqual(
+            User.objects.get(email="user1@example.com").full_name, "Renamed 1"
+        )
+        user3 = User.objects.get(email="user3@example.com")
+        self.assertFalse(user3.is_active)
+        self.assertEqual(user3.full_name, "User 3")
+        new = User.objects.get(email="new@example.com")
+        self.assertEqual(new.full_name, "New")
+        self.assertTrue(new.check_password("pass!"))
+        self.assertTrue(User.objects.get(email="user0@example.com").is_active)
+
+    def test_bulk_upsert(self):
+        """Only new and changed users are written: upserts for new ones"""
+        with CaptureQueriesContext(connection) as context:
+            created, updated = User.objects.bulk_upsert(self.records())
+        self.assertEqual((created, updated), (1, 2))
+        writes = [
+            query["sql"]
+            for query in context
+            if not query["sql"].startswith(("SELECT", "SAVEPOINT", "RELEASE"))
+        ]
+        self.assertEqual(len(writes), 2)
+        insert, update = writes
+        self.assertTrue(insert.startswith("INSERT"))
+        self.assertIn("ON CONFLICT", insert)
+        self.assertTrue(update.startswith("UPDATE"))
+        for sql in writes:
+            self.assertNotIn("user0@example.com", sql)
+            self.assertNotIn("user2@example.com", sql)
+        self.assert_synchronized()
+
+    def test_bulk_upsert_deleted_meanwhile(self):
+        """Users deleted after they were compared are not recreated"""
+        diff_records = UserManager._diff_records
+
+        def diff_then_delete(manager, *args):
+            result = diff_records(manager, *args)
+            User.objects.filter(email="user1@example.com").delete()
+            return result
+
+        with patch.object(UserManager, "_diff_records", diff_then_delete):
+            created, updated = User.objects.bulk_upsert(self.records())
+        self.assertEqual((created, updated), (1, 1))
+        self.assertFalse(
+            User.objects.filter(email="user1@example.com").exists()
+        )
+
+    def test_bulk_upsert_key_only(self):
+        """Records may hold only the key and a password"""
+        created, updated = User.objects.bulk_upsert(
+            [
+                {"email": "user0@example.com"},
+                {"email": "new@example.com", "password": "password!"},
+            ]
+        )
+        self.assertEqual((created, updated), (1, 0))
+        user = User.objects.get(email="new@example.com")
+        self.assertTrue(user.check_password("password!"))
+
+    def test_bulk_upsert_converts_values(self):
+        """Values of new users are converted by their fields"""
+        User.objects.bulk_upsert(
+            [{"email": "new@example.com", "is_staff": "True"}]
+        )
+        self.assertIs(User.objects.get(email="new@example.com").is_staff, True)
+
+    def test_bulk_upsert_unchanged(self):
+        """Nothing is written if nothing changed"""
+        self.assertEqual(User.objects.bulk_upsert(self.records()), (1, 2))
+        with self.assertNumQueries(1):
+            result = User.objects.bulk_upsert(self.records())
+        self.assertEqual(result, (0, 0))
+
+    def test_bulk_upsert_update_fields(self):
+        """Only update_fields are compared and written"""
+        created, updated = User.objects.bulk_upsert(
+            self.records(), update_fields=["is_active"], batch_size=2
+        )
+        self.assertEqual((created, updated), (1, 1))
+        self.assertEqual(
+            User.objects.get(email="user1@example.com").full_name, "User 1"
+        )
+
+    def test_bulk_upsert_without_on_conflict(self):
+        """Databases without upserts insert and update separately"""
+        with patch.object(
+            connection.features,
+            "supports_update_conflicts_with_target",
+            False,
+        ), CaptureQueriesContext(connection) as context:
+            User.objects.bulk_upsert(self.records())
+        self.assertFalse(
+            any("ON CONFLICT" in query["sql"] for query in context)
+        )
+        self.assert_synchronized()
+
+    def test_bulk_upsert_invalidates_cache(self):
+        """Changed users are removed from cache"""
+        user = User.objects.get(email="user1@example.com")
+        self.assertEqual(User.objects.get_cached(user.pk).full_name, "User 1")
+        User.objects.bulk_upsert(self.records())
+        self.assertEqual(
+            User.objects.get_cached(user.pk).full_name, "Renamed 1"
+        )
+
+    @override_settings(IMPROVED_USER_CASE_INSENSITIVE_EMAIL=True)
+    def test_bulk_upsert_case_insensitive(self):
+        """Emails match ignoring case, if enabled"""
+        created, updated = User.objects.bulk_upsert(
+            [{"email": "USER1@example.com", "full_name": "Renamed 1"}]
+        )
+        self.assertEqual((created, updated), (0, 1))
+        self.assertEqual(
+            User.objects.get(email="user1@example.com").full_name, "Renamed 1"
+        )
+
+
+class GetOrCreateUserTestCase(TestCase):
+    """Test UserManager.get_or_create_user"""
+
+    def test_get(self):
+        """An existing user is fetched with one query"""
+        existing = User.objects.create_user("hello@jambonsw.com", "pass!")
+        with self.assertNumQueries(1):
+            user, created = User.objects.get_or_create_user(
+                "hello@JAMBONSW.COM", "other!"
+            )
+        self.assertFalse(created)
+        self.assertEqual(user, existing)
+        self.assertTrue(user.check_password("pass!"))
+
+    def test_create(self):
+        """A new user is created with defaults"""
+        user, created = User.objects.get_or_create_user(
+            "hello@JAMBONSW.COM", "pass!", defaults={"short_name": "Andrew"}
+        )
+        self.assertTrue(created)
+        user = User.objects.get(pk=user.pk)
+        self.assertEqual(user.email, "hello@jambonsw.com")
+        self.assertEqual(user.short_name, "Andrew")
+        self.assertTrue(user.check_password("pass!"))
+        self.assertFalse(user.is_staff)
+
+    def test_race(self):
+        """A user created concurrently is returned, without error"""
+        build_user = User.objects._build_user
+
+        def racing_build_user(email, *args, **kwargs):
+            # another request creates the user between select and insert
+            User(email=email, password=make_password("winner!")).save()
+            return build_user(email, *args, **kwargs)
+
+        with patch.object(
+            User.objects, "_build_user", side_effect=racing_build_user
+        ):
+            user, created = User.objects.get_or_create_user(
+                "hello@jambonsw.com", "loser!"
+            )
+        self.assertFalse(created)
+        self.assertTrue(user.check_password("winner!"))
+        self.assertEqual(User.objects.count(), 1)
+
+    @override_settings(IMPROVED_USER_CASE_INSENSITIVE_EMAIL=True)
+    def test_case_insensitive(self):
+        """Email case is ignored, if enabled"""
+        existing = User.objects.create_user("Hello@jambonsw.com")
+        user, created = User.objects.get_or_create_user("hello@jambonsw.com")
+        self.assertFalse(created)
+        self.assertEqual(user, existing)
+
+    @override_settings(IMPROVED_USER_CASE_INSENSITIVE_EMAIL=True)
+    def test_case_insensitive_duplicates(self):
+        """Emails differing by case resolve to the exact match, if any"""
+        User.objects.create_user("Hello@jambonsw.com")
+        lower = User.objects.create_user("hello@jambonsw.com")
+        self.assertEqual(
+            User.objects.get_or_create_user("hello@jambonsw.com"),
+            (lower, False),
+        )
+        with self.assertRaises(User.MultipleObjectsReturned):
+            User.objects.get_or_create_user("HELLO@jambonsw.com")
+        self.assertEqual(User.objects.count(), 2)
+
+    def test_other_integrity_error(self):
+        """Integrity errors for other reasons are raised"""
+        with self.assertRaises(IntegrityError):
+            User.objects.get_or_create_user(
+                "hello@jambonsw.com", defaults={"id": -1, "full_name": None}
+            )
+
+
+class EmailUsersTestCase(TestCase):
+    """Test UserManager.email_users"""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create users to email"""
+        User.objects.bulk_create(
+            User(email=f"user{i}@example.com", is_active=i != 2)
+            for i in range(5)
+        )
+
+    def test_email_users(self):
+        """Each user gets their own message over a single connection"""
+        connection = mail.get_connection()
+        with patch.object(
+            connection, "send_messages", wraps=connection.send_messages
+        ) as send_messages, patch(
+            "improved_user.managers.get_connection", return_value=connection
+        ) as get_connection:
+            sent = User.objects.email_users(
+                User.objects.filter(is_active=True).order_by("pk"),
+                "Subject here",
+                "This is a message",
+                "from@domain.com",
+                chunk_size=3,
+                html_message="<p>This is a message</p>",
+            )
+        self.assertEqual(sent, 4)
+        get_connection.assert_called_once()
+        self.assertEqual(send_messages.call_count, 2)
+        self.assertEqual(
+            [message.to for message in mail.outbox],
+            [[f"user{i}@example.com"] for i in (0, 1, 3, 4)],
+        )
+        message = mail.outbox[0]
+        self.assertEqual(message.subject, "Subject here")
+        self.assertEqual(message.body, "This is a message")
+        self.assertEqual(message.from_email, "from@domain.com")
+        self.assertEqual(
+            message.alternatives, [("<p>This is a message</p>", "text/html")]
+        )
+
+    def test_email_users_connection(self):
+        """A connection may be provided, and the queryset omitted"""
+        connection = mail.get_connection()
+        with self.assertNumQueries(1):
+            sent = User.objects.email_users(
+                None, "Subject", "Message", connection=connection
+            )
+        self.assertEqual(sent, 5)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertFalse(mail.outbox[0].alternatives)
+
+    def test_email_users_none(self):
+        """Nothing is sent to an empty queryset"""
+        sent = User.objects.email_users(User.objects.none(), "S", "M")
+        self.assertEqual(sent, 0)
+        self.assertEqual(mail.outbox, [])
+
+
+class CaseInsensitiveEmailTestCase(TestCase):
+    """Test opt-in case-insensitive email lookups"""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create a user with a mixed-case email"""
+        cls.user = User.objects.create_user("Hello@JambonSW.com", "password")
+
+    def test_case_sensitive_by_default(self):
+        """Emails differing in case are different natural keys"""
+        with self.assertRaises(User.DoesNotExist):
+            User.objects.get_by_natural_key("hello@jambonsw.com")
+        self.assertIsNone(
+            authenticate(email="hello@jambonsw.com", password="password")
+        )
+
+    @override_settings(IMPROVED_USER_CASE_INSENSITIVE_EMAIL=True)
+    def test_setting_enables_case_insensitive_lookup(self):
+        """Project setting enables case-insensitive natural keys"""
+        self.assertEqual(
+            User.objects.get_by_natural_key("HELLO@jambonsw.COM"), self.user
+        )
+        self.assertEqual(
+            authenticate(email="hello@jambonsw.com", password="password"),
+            self.user,
+        )
+
+    def test_model_attribute_enables_case_insensitive_lookup(self):
+        """Model attribute enables case-insensitive natural keys"""
+        with patch.object(User, "EMAIL_CASE_INSENSITIVE", True):
+            self.assertEqual(
+                User.objects.get_by_natural_key("hello@jambonsw.com"),
+                self.user,
+            )
+
+    @override_settings(IMPROVED_USER_CASE_INSENSITIVE_EMAIL=True)
+    def test_emails_differing_by_case(self):
+        """Several matches resolve to the exact email, or to none"""
+        other = User.objects.create_user("hello@jambonsw.com", "other")
+        self.assertEqual(
+            User.objects.get_by_natural_key("hello@jambonsw.com"), other
+        )
+        self.assertEqual(
+            User.objects.get_by_natural_key("Hello@jambonsw.com"), self.user
+        )
+        with self.assertRaises(User.DoesNotExist):
+            User.objects.get_by_natural_key("HELLO@jambonsw.com")
+        self.assertEqual(
+            authenticate(email="hello@jambonsw.com", password="other"), other
+        )
+        self.assertIsNone(
+            authenticate(email="HELLO@jambonsw.com", password="password")
+        )
+
+    @override_settings(IMPROVED_USER_CASE_INSENSITIVE_EMAIL=True)
+    def test_case_insensitive_lookup_uses_lower(self):
+        """Lookup compares LOWER(email) to use the functional index"""
+        with self.assertNumQueries(1) as context:
+            User.objects.get_by_natural_key("hello@jambonsw.com")
+        self.assertIn("LOWER(", context.captured_queries[0]["sql"].upper())
+
+
+class UserSnapshotTestCase(TestCase):
+    """Test UserQuerySet.snapshots"""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create users to list"""
+        cls.ada = User.objects.create_user(
+            "ada@example.com", full_name="Ada Lovelace", short_name="Ada"
+        )
+        cls.staff = User.objects.create_user(
+            "staff@example.com", is_staff=True, is_active=False
+        )
+
+    def test_snapshots(self):
+        """Snapshots hold the values of each User"""
+        with self.assertNumQueries(1):
+            ada, staff = User.objects.order_by("pk").snapshots()
+        self.assertIsInstance(ada, UserSnapshot)
+        self.assertEqual(ada, UserSnapshot(self.ada.pk, "ada@example.com"))
+        self.assertEqual(ada.email, "ada@example.com")
+        self.assertEqual(ada.get_full_name(), "Ada Lovelace")
+        self.assertEqual(ada.get_short_name(), "Ada")
+        self.assertEqual(
+            (staff.is_active, staff.is_staff, staff.is_superuser),
+            (False, True, False),
+        )
+        self.assertFalse(hasattr(ada, "__dict__"))
+
+    def test_read_only(self):
+        """Snapshots may not be changed"""
+        ada = UserSnapshot(self.ada.pk, "ada@example.com")
+        with self.assertRaisesMessage(AttributeError, "cannot set email"):
+            ada.email = "grace@example.com"
+        with self.assertRaisesMessage(AttributeError, "cannot delete email"):
+            del ada.email
+        self.assertEqual(ada.email, "ada@example.com")
+
+    def test_chain(self):
+        """Snapshots may be filtered, ordered and sliced"""
+        snapshots = User.objects.snapshots()
+        self.assertEqual(
+            list(snapshots.filter(is_staff=True).values_list("email")),
+            [("staff@example.com",)],
+        )
+        self.assertEqual(
+            [s.pk for s in snapshots.order_by("-pk")[:1]], [self.staff.pk]
+        )
+        self.assertEqual(
+            [s.email for s in snapshots.filter(is_active=True).iterator()],
+            ["ada@example.com"],
+        )
+
+
+class PrefetchPermissionsTestCase(TestCase):
+    """Test prefetch_permissions and UserQuerySet.with_permissions"""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create users with direct, group and superuser permissions"""
+        change, delete = Permission.objects.filter(
+            content_type__app_label="improved_user",
+            codename__in=["change_user", "delete_user"],
+        ).order_by("codename")
+        group = Group.objects.create(name="editors")
+        group.permissions.add(delete)
+        cls.direct = User.objects.create_user("direct@example.com")
+        cls.direct.user_permissions.add(change)
+        cls.grouped = User.objects.create_user("grouped@example.com")
+        cls.grouped.groups.add(group)
+        cls.both = User.objects.create_user("both@example.com")
+        cls.both.user_permissions.add(change)
+        cls.both.groups.add(group)
+        cls.inactive = User.objects.create_user(
+            "inactive@example.com", is_active=False
+        )
+        cls.inactive.user_permissions.add(change)
+        cls.superuser = User.objects.create_superuser(
+            "super@example.com", "password!"
+        )
+
+    def test_prefetch_permissions(self):
+        """Permissions match ModelBackend's, at no further queries"""
+        expected = {
+            user.pk: (user.get_user_permissions(), user.get_all_permissions())
+            for user in User.objects.all()
+        }
+        users = list(User.objects.all())
+        # user permissions, memberships, group permissions, all
+        with self.assertNumQueries(4):
+            result = prefetch_permissions(users)
+        with self.assertNumQueries(0):
+            for user in users:
+                user_perms, all_perms = expected[user.pk]
+                self.assertEqual(result[user.pk], all_perms)
+                self.assertEqual(user.get_user_permissions(), user_perms)
+                self.assertEqual(user.get_all_permissions(), all_perms)
+        self.assertEqual(
+            result[self.both.pk],
+            {"improved_user.change_user", "improved_user.delete_user"},
+        )
+        self.assertEqual(result[self.inactive.pk], set())
+
+    def test_with_permissions(self):
+        """Users of with_permissions() check permissions without queries"""
+        queryset = User.objects.filter(is_superuser=False).with_permissions()
+        with self.assertNumQueries(4):
+            users = list(queryset.order_by("pk"))
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                [user.has_perm("improved_user.delete_user") for user in users],
+                [False, True, True, False],
+            )
+        # user has no groups: their permissions are not queried
+        with self.assertNumQueries(3):
+            user = queryset.get(pk=self.direct.pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(user.has_perm("improved_user.change_user"))
+
+    def test_without_users(self):
+        """No queries are made without users to resolve"""
+        with self.assertNumQueries(0):
+            self.assertEqual(prefetch_permissions([]), {})
+            self.assertEqual(
+                prefetch_permissions([self.inactive]),
+                {self.inactive.pk: set()},
+            )
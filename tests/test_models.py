@@ -6,8 +6,12 @@ from unittest.mock import patch
 
 from django.contrib.auth.hashers import get_hasher
 from django.core import mail
-from django.test import TestCase
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import isolate_apps
 
+from improved_user.model_mixins import EmailAuthMixin
 from improved_user.models import User
 
 
@@ -69,6 +73,23 @@ class UserModelTestCase(TestCase):
         self.assertEqual(message.from_email, "from@domain.com")
         self.assertEqual(message.to, [user.email])
 
+    def test_email_user_background(self):
+        """Send Email to User from a background thread"""
+        user = User(email="foo@bar.com")
+        future = user.email_user(
+            "Subject here", "This is a message", background=True
+        )
+        self.assertEqual(future.result(timeout=5), 1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, [user.email])
+
+    async def test_aemail_user(self):
+        """Send Email to User asynchronously"""
+        user = User(email="foo@bar.com")
+        await user.aemail_user("Subject here", "This is a message")
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].subject, "Subject here")
+
     def test_last_login_default(self):
         """Check last login not set upon creation"""
         user1 = User.objects.create(email="test1@example.com")
@@ -133,3 +154,82 @@ class UserModelTestCase(TestCase):
             self.assertNotEqual(initial_password, user.password)
         finally:
             hasher.iterations = old_iterations
+
+
+class UserIndexTestCase(TestCase):
+    """Test indexes on fields of DjangoIntegrationMixin"""
+
+    def query_plan(self, queryset):
+        """Return SQLite query plan of queryset; helper method"""
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            return " ".join(row[-1] for row in cursor.fetchall())
+
+    def test_indexes_exist(self):
+        """Indexes are created by migrations"""
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, User._meta.db_table
+            )
+        self.assertEqual(
+            constraints["improved_user_user_active_idx"]["columns"],
+            ["is_active", "date_joined"],
+        )
+        self.assertEqual(
+            constraints["improved_user_user_staff_idx"]["columns"],
+            ["is_staff"],
+        )
+        self.assertTrue(constraints["improved_user_user_joined_idx"]["index"])
+
+    def test_staff_lookup_uses_index(self):
+        """Looking up staff does not scan the table"""
+        plan = self.query_plan(User.objects.filter(is_staff=True))
+        self.assertIn("improved_user_user_staff_idx", plan)
+
+    def test_join_date_range_uses_index(self):
+        """Join date reports do not scan the table"""
+        start, end = datetime(2024, 1, 1), datetime(2025, 1, 1)
+        plan = self.query_plan(
+            User.objects.filter(date_joined__range=(start, end))
+        )
+        self.assertIn("improved_user_user_joined_idx", plan)
+        plan = self.query_plan(
+            User.objects.filter(
+                is_active=True, date_joined__range=(start, end)
+            )
+        )
+        self.assertIn("USING INDEX", plan)
+
+
+class CaseInsensitiveMetaTestCase(TransactionTestCase):
+    """Test EmailAuthMixin.CaseInsensitiveMeta"""
+
+    @isolate_apps("improved_user")
+    def test_unique_lower_email(self):
+        """Emails differing only by case are rejected"""
+
+        class CaseInsensitiveUser(EmailAuthMixin):
+            """User model opting into case-insensitive uniqueness"""
+
+            class Meta(EmailAuthMixin.CaseInsensitiveMeta):
+                """Meta options with the LOWER(email) constraint"""
+
+                app_label = "improved_user"
+
+        (constraint,) = CaseInsensitiveUser._meta.constraints
+        self.assertEqual(
+            constraint.name, "improved_user_caseinsensitiveuser_email_ci_uniq"
+        )
+        with connection.schema_editor() as editor:
+            editor.create_model(CaseInsensitiveUser)
+        try:
+            CaseInsensitiveUser.objects.create(email="ada@example.com")
+            duplicate = CaseInsensitiveUser(email="Ada@example.com")
+            with self.assertRaises(ValidationError):
+                duplicate.validate_constraints()
+            with self.assertRaises(IntegrityError):
+                duplicate.save()
+        finally:
+            with connection.schema_editor() as editor:
+                editor.delete_model(CaseInsensitiveUser)
@@ -0,0 +1,119 @@
+"""Test password validators for Improved User"""
+
+from unittest.mock import patch
+
+from django.contrib.auth import password_validation as django_validation
+from django.core.exceptions import ValidationError
+from django.test import TestCase, override_settings
+
+from improved_user.forms import UserCreationForm
+from improved_user.models import User
+from improved_user.password_validation import (
+    CommonPasswordValidator,
+    UserAttributeSimilarityValidator,
+)
+
+
+class CommonPasswordValidatorTestCase(TestCase):
+    """Test CommonPasswordValidator"""
+
+    def test_validate(self):
+        """Common passwords are rejected, as by Django's validator"""
+        validator = CommonPasswordValidator()
+        validator.validate("a-less-common-passw0rd")
+        with self.assertRaises(ValidationError) as context:
+            validator.validate("Password ")
+        self.assertEqual(
+            context.exception.error_list[0].code, "password_too_common"
+        )
+        self.assertEqual(
+            validator.passwords,
+            django_validation.CommonPasswordValidator().passwords,
+        )
+
+    def test_password_list_shared(self):
+        """The password list is loaded once and shared"""
+        validator = CommonPasswordValidator()
+        self.assertIsInstance(validator.passwords, frozenset)
+        with patch("improved_user.password_validation.gzip.open") as gzip_open:
+            other = CommonPasswordValidator()
+        gzip_open.assert_not_called()
+        self.assertIs(other.passwords, validator.passwords)
+
+
+class UserAttributeSimilarityValidatorTestCase(TestCase):
+    """Test UserAttributeSimilarityValidator"""
+
+    def setUp(self):
+        """Instantiate a user and the validator"""
+        self.user = User(
+            email="lovelace@example.com",
+            full_name="Augusta Ada King",
+            short_name="Ada",
+        )
+        self.validator = UserAttributeSimilarityValidator()
+
+    def test_default_attributes(self):
+        """Email and names are compared by default"""
+        for password, verbose_name in (
+            ("LOVELACE", "email address"),
+            ("augustaa", "full name"),
+            ("augusta ada king", "full name"),
+        ):
+            with self.subTest(password=password):
+                with self.assertRaisesMessage(
+                    ValidationError,
+                    f"The password is too similar to the {verbose_name}.",
+                ):
+                    self.validator.validate(password, self.user)
+        self.validator.validate("c0rrect-h0rse-battery", self.user)
+
+    def test_no_user(self):
+        """Nothing is compared without a user"""
+        self.validator.validate("lovelace")
+        self.validator.validate("", self.user)
+
+    def test_parts_compared_once(self):
+        """Empty and repeated parts are skipped"""
+        self.user.short_name = "augusta"
+        with patch(
+            "improved_user.password_validation.SequenceMatcher",
+            wraps=django_validation.SequenceMatcher,
+        ) as matcher:
+            self.validator.validate("zzzzzzzzzz", self.user)
+        compared = [call.kwargs["b"] for call in matcher.call_args_list]
+        self.assertEqual(len(compared), len(set(compared)))
+        self.assertNotIn("", compared)
+
+    @override_settings(
+        AUTH_PASSWORD_VALIDATORS=[
+            {
+                "NAME": "improved_user.password_validation."
+                "UserAttributeSimilarityValidator",
+            },
+            {
+                "NAME": "improved_user.password_validation."
+                "CommonPasswordValidator",
+            },
+        ]
+    )
+    def test_user_creation_form(self):
+        """The validators may be configured for UserCreationForm"""
+        data = {
+            "email": "lovelace@example.com",
+            "full_name": "Augusta Ada King",
+            "short_name": "Ada",
+        }
+        form = UserCreationForm(
+            {**data, "password1": "Lovelace!", "password2": "Lovelace!"}
+        )
+        self.assertEqual(
+            form.errors["password1"],
+            ["The password is too similar to the email address."],
+        )
+        form = UserCreationForm(
+            {**data, "password1": "password", "password2": "password"}
+        )
+        self.assertEqual(
+            form.errors["password1"], ["This password is too common."]
+        )
@@ -0,0 +1,184 @@
+"""Test full-text search of Users"""
+
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from django.apps import apps
+from django.db import NotSupportedError, connection, transaction
+from django.db.migrations.state import ProjectState
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from improved_user.models import User
+from improved_user.search import (
+    CreateSearchIndex,
+    DropSearchIndex,
+    create_search_index,
+    drop_search_index,
+    search_table_name,
+)
+
+
+class SearchIndexMixin:
+    """Create the search index for the tests of a TestCase"""
+
+    @classmethod
+    def setUpClass(cls):
+        """Create the index outside of the transaction of the class"""
+        with connection.schema_editor() as editor:
+            create_search_index(editor, User)
+        cls.addClassCleanup(cls.drop_search_index)
+        super().setUpClass()
+
+    @classmethod
+    def drop_search_index(cls):
+        """Drop the index once the class is torn down"""
+        with connection.schema_editor() as editor:
+            drop_search_index(editor, User)
+
+
+@override_settings(IMPROVED_USER_SEARCH_INDEX=True)
+class SearchTestCase(SearchIndexMixin, TestCase):
+    """Test UserManager.search() and the search index"""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create Users to search for"""
+        cls.ada = User.objects.create_user(
+            "ada@example.com", full_name="Ada Lovelace", short_name="Ada"
+        )
+        cls.grace = User.objects.create_user(
+            "grace@navy.mil", full_name="Grace Hopper", short_name="Grace"
+        )
+        cls.fan = User.objects.create_user(
+            "fan@example.org", full_name="Ada Fan", short_name="Fan"
+        )
+
+    def test_search_names(self):
+        """Words match the start of words in the names"""
+        self.assertEqual(list(User.objects.search("hopp")), [self.grace])
+        self.assertEqual(list(User.objects.search("ada lov")), [self.ada])
+        self.assertEqual(list(User.objects.search("LOVELACE ADA")), [self.ada])
+
+    def test_search_email(self):
+        """Words match parts of the email"""
+        self.assertEqual(list(User.objects.search("navy")), [self.grace])
+        self.assertEqual(
+            list(User.objects.search("ada@example.com")), [self.ada]
+        )
+
+    def test_search_ranked(self):
+        """Better matches are returned first"""
+        results = list(User.objects.search("ada"))
+        self.assertEqual(results, [self.ada, self.fan])
+        self.assertGreater(results[0].search_rank, results[1].search_rank)
+
+    def test_search_nothing(self):
+        """Queries without words find nothing"""
+        self.assertEqual(list(User.objects.search("")), [])
+        self.assertEqual(list(User.objects.search(" @. ")), [])
+        self.assertEqual(list(User.objects.search("turing")), [])
+
+    def test_search_uses_index(self):
+        """The search index is queried instead of the names"""
+        with CaptureQueriesContext(connection) as context:
+            list(User.objects.search("ada"))
+        self.assertEqual(len(context), 1)
+        sql = context[0]["sql"]
+        self.assertIn(f'"{search_table_name(User)}" MATCH', sql)
+        self.assertNotIn("LIKE", sql)
+
+    def test_index_updated(self):
+        """Changes to Users are reflected in the index"""
+        self.grace.full_name = "Grace Brewster Hopper"
+        self.grace.save()
+        self.assertEqual(list(User.objects.search("brew")), [self.grace])
+        self.assertEqual(list(User.objects.search("fan")), [self.fan])
+        self.fan.delete()
+        self.assertEqual(list(User.objects.search("fan")), [])
+
+    def test_index_not_updated_on_login(self):
+        """Changes to other columns do not fire the update trigger"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT sql FROM sqlite_master WHERE type = 'trigger' "
+                "AND name = %s",
+                [f"{search_table_name(User)}_update"],
+            )
+            (sql,) = cursor.fetchone()
+        self.assertIn(
+            'AFTER UPDATE OF "email", "full_name", "short_name" ON', sql
+        )
+
+    def test_search_without_index(self):
+        """Models without SEARCH_FIELDS are searched with icontains"""
+        with patch.object(User, "SEARCH_FIELDS", None):
+            with CaptureQueriesContext(connection) as context:
+                results = set(User.objects.search("ada lov"))
+        self.assertEqual(results, {self.ada})
+        self.assertIn("LIKE", context[0]["sql"])
+
+    @override_settings(IMPROVED_USER_SEARCH_INDEX=False)
+    def test_search_index_disabled(self):
+        """The index is only used once enabled by the setting"""
+        with CaptureQueriesContext(connection) as context:
+            results = set(User.objects.search("ada lov"))
+        self.assertEqual(results, {self.ada})
+        self.assertIn("LIKE", context[0]["sql"])
+
+
+class SearchIndexOperationTestCase(TransactionTestCase):
+    """Test the search index migration operations"""
+
+    @override_settings(IMPROVED_USER_SEARCH_INDEX=True)
+    def test_create_and_drop(self):
+        """The index may be created (with existing rows) and dropped"""
+        user = User.objects.create_user("ada@example.com", full_name="Ada")
+        state = ProjectState.from_apps(apps)
+        # as in a migration of another app
+        create = CreateSearchIndex("user", app_label="improved_user")
+        drop = DropSearchIndex("user", app_label="improved_user")
+        self.assertNotIn(
+            search_table_name(User), connection.introspection.table_names()
+        )
+        with connection.schema_editor() as editor:
+            create.database_forwards("user_app", editor, state, state)
+        self.assertEqual(list(User.objects.search("ada")), [user])
+        with connection.schema_editor() as editor:
+            drop.database_forwards("user_app", editor, state, state)
+        self.assertNotIn(
+            search_table_name(User), connection.introspection.table_names()
+        )
+
+    def test_postgresql_not_atomic(self):
+        """On PostgreSQL, the index may not be created in a transaction"""
+        state = ProjectState.from_apps(apps)
+        operation = CreateSearchIndex("user")
+        with patch.object(connection, "vendor", "postgresql"):
+            with transaction.atomic():
+                with self.assertRaisesMessage(
+                    NotSupportedError, "set atomic = False"
+                ):
+                    operation.database_forwards(
+                        "improved_user",
+                        SimpleNamespace(connection=connection),
+                        state,
+                        state,
+                    )
+
+    def test_deconstruct(self):
+        """The operation may be serialized in migrations"""
+        name, args, kwargs = CreateSearchIndex(
+            "user", fields=["email"]
+        ).deconstruct()
+        self.assertEqual(name, "CreateSearchIndex")
+        self.assertEqual(args, ("user",))
+        self.assertEqual(kwargs, {"fields": ["email"]})
+        self.assertEqual(
+            CreateSearchIndex("user", app_label="improved_user").deconstruct(),
+            ("CreateSearchIndex", ("user",), {"app_label": "improved_user"}),
+        )
+        self.assertEqual(
+            CreateSearchIndex("user").describe(),
+            "Create search index on user",
+        )